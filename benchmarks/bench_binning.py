@@ -0,0 +1,54 @@
+from calibration.binning import (BinningTree, UniformBinning,
+                                 DataDependentBinning)
+
+from .common import check_size, make_data
+
+
+class UniformBinningFit:
+    params = ([10**3, 10**4, 10**5, 10**6, 10**7], [2, 10, 100, 1000],
+              [2, 10])
+    param_names = ["N", "C", "bins"]
+
+    def setup(self, N, C, bins):
+        check_size(N, C)
+        self.probs, _ = make_data(N, C)
+        self.tree = BinningTree(UniformBinning(bins=bins))
+
+    def time_fit(self, N, C, bins):
+        self.tree.fit(self.probs)
+
+    def peakmem_fit(self, N, C, bins):
+        self.tree.fit(self.probs)
+
+    def time_fit_binnumbers(self, N, C, bins):
+        self.tree.fit(self.probs).binnumbers
+
+
+class DataDependentBinningFit:
+    params = ([10**3, 10**4, 10**5, 10**6], [2, 10, 100],
+              [10, 100, 1000])
+    param_names = ["N", "C", "min_size"]
+
+    def setup(self, N, C, min_size):
+        check_size(N, C)
+        self.probs, _ = make_data(N, C)
+        self.tree = BinningTree(DataDependentBinning(min_size=min_size))
+
+    def time_fit(self, N, C, min_size):
+        self.tree.fit(self.probs)
+
+    def peakmem_fit(self, N, C, min_size):
+        self.tree.fit(self.probs)
+
+
+class Predict:
+    params = ([10**4, 10**5, 10**6], [2, 10, 100])
+    param_names = ["N", "C"]
+
+    def setup(self, N, C):
+        check_size(N, C)
+        self.probs, _ = make_data(N, C)
+        self.tree = BinningTree(DataDependentBinning()).fit(self.probs)
+
+    def time_predict(self, N, C):
+        self.tree.predict(self.probs)
@@ -0,0 +1,60 @@
+import calibration.stats as stats
+from calibration.binning import UniformBinning
+
+from .common import check_size, make_data
+
+
+class ECE:
+    params = ([10**3, 10**4, 10**5, 10**6, 10**7], [2, 10, 100, 1000],
+              [2, 10])
+    param_names = ["N", "C", "bins"]
+
+    def setup(self, N, C, bins):
+        check_size(N, C)
+        self.probs, self.y = make_data(N, C)
+        self.binning = UniformBinning(bins=bins)
+
+    def time_ece(self, N, C, bins):
+        stats.ece(self.probs, self.y, binning=self.binning)
+
+    def peakmem_ece(self, N, C, bins):
+        stats.ece(self.probs, self.y, binning=self.binning)
+
+    def time_ece_consistent(self, N, C, bins):
+        stats.ece(self.probs, None, binning=self.binning, rng=1)
+
+
+class ECEChunks:
+    params = ([10**5, 10**6, 10**7], [2, 10, 100], [10**4, 10**5])
+    param_names = ["N", "C", "chunksize"]
+
+    def setup(self, N, C, chunksize):
+        check_size(N, C)
+        self.probs, self.y = make_data(N, C)
+
+    def time_ece(self, N, C, chunksize):
+        stats.ece(self.probs, self.y, chunksize=chunksize)
+
+    def peakmem_ece(self, N, C, chunksize):
+        stats.ece(self.probs, self.y, chunksize=chunksize)
+
+
+class Resampling:
+    params = ([10**3, 10**4, 10**5], [2, 10, 100], [100])
+    param_names = ["N", "C", "n"]
+
+    def setup(self, N, C, n):
+        check_size(N * n, C)
+        self.probs, self.y = make_data(N, C)
+
+    def time_bootstrap_ece(self, N, C, n):
+        stats.bootstrap_ece(self.probs, self.y, n=n, rng=1)
+
+    def peakmem_bootstrap_ece(self, N, C, n):
+        stats.bootstrap_ece(self.probs, self.y, n=n, rng=1)
+
+    def time_consistency_ece(self, N, C, n):
+        stats.consistency_ece(self.probs, n=n, rng=1)
+
+    def peakmem_consistency_ece(self, N, C, n):
+        stats.consistency_ece(self.probs, n=n, rng=1)
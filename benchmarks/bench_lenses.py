@@ -0,0 +1,28 @@
+import numpy as np
+
+import calibration.lenses as lenses
+
+from .common import check_size, make_data
+
+
+class Lenses:
+    params = ([10**3, 10**4, 10**5, 10**6, 10**7], [2, 10, 100, 1000])
+    param_names = ["N", "C"]
+
+    def setup(self, N, C):
+        check_size(N, C)
+        self.probs, self.y = make_data(N, C)
+        self.group_lens = lenses.GroupLens(
+            groups=np.array_split(np.arange(C), max(C // 10, 1)))
+
+    def time_maximum_lens(self, N, C):
+        lenses.maximum_lens(self.probs, self.y)
+
+    def time_top2_lens(self, N, C):
+        lenses.top2_lens(self.probs, self.y)
+
+    def time_group_lens(self, N, C):
+        self.group_lens(self.probs, self.y)
+
+    def peakmem_group_lens(self, N, C):
+        self.group_lens(self.probs, self.y)
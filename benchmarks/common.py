@@ -0,0 +1,27 @@
+import numpy as np
+
+
+# Largest number of probabilities `N * C` of a benchmark; larger benchmarks
+# are skipped unless the limit is raised (e.g., by `run.py --max-elements`)
+MAX_ELEMENTS = 10**7
+
+
+def check_size(N, C):
+    """Skip benchmarks with more than `MAX_ELEMENTS` probabilities."""
+    if N * C > MAX_ELEMENTS:
+        raise NotImplementedError(
+            "{} x {} probabilities exceed the limit of {}".format(
+                N, C, MAX_ELEMENTS))
+
+
+def make_data(N, C, seed=1234):
+    """
+    Return random probabilities of shape `(N, C)` and labels of shape `(N,)`
+    that are sampled from them.
+    """
+    rng = np.random.Generator(np.random.PCG64(seed))
+    probs = rng.dirichlet(np.ones(C), N)
+    cumprobs = np.cumsum(probs, axis=1)
+    y = np.minimum((rng.random((N, 1)) >= cumprobs).sum(axis=1), C - 1)
+
+    return probs, y
@@ -0,0 +1,135 @@
+"""
+Run the benchmarks without airspeed velocity.
+
+The benchmarks follow the conventions of airspeed velocity (asv): every
+class defines the parameters `params` with names `param_names`, a method
+`setup`, and benchmarks whose names start with `time_` or `peakmem_`. This
+script evaluates all combinations of parameters and reports the best wall
+time of `time_` benchmarks (measured with `time.perf_counter`) and the peak
+memory that is allocated by `peakmem_` benchmarks (measured with
+`tracemalloc`, which tracks the allocations of NumPy arrays as well).
+
+Run it from the root of the repository, e.g.:
+
+    python -m benchmarks.run --bench "ECE|Lenses" --max-elements 1e6
+"""
+import argparse
+import importlib
+import inspect
+import itertools
+import json
+import pkgutil
+import re
+import sys
+import time
+import tracemalloc
+
+from . import common
+
+
+def discover():
+    """Return list of benchmark classes, qualified by their module name."""
+    import benchmarks
+
+    classes = []
+    for module_info in pkgutil.iter_modules(benchmarks.__path__):
+        if not module_info.name.startswith("bench_"):
+            continue
+
+        module = importlib.import_module("benchmarks." + module_info.name)
+        for name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ == module.__name__:
+                classes.append((module_info.name + "." + name, cls))
+
+    return classes
+
+
+def measure(method, args, repeat):
+    """Evaluate benchmark `method` with arguments `args`."""
+    if method.__name__.startswith("time_"):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            method(*args)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    tracemalloc.start()
+    try:
+        method(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(pattern=None, repeat=3):
+    """Run all benchmarks whose qualified name matches regex `pattern`."""
+    results = []
+    for qualname, cls in discover():
+        params = getattr(cls, "params", [])
+        param_names = getattr(cls, "param_names", [])
+        methods = [name for name in dir(cls)
+                   if name.startswith(("time_", "peakmem_"))]
+
+        for name in methods:
+            fullname = qualname + "." + name
+            if pattern is not None and not re.search(pattern, fullname):
+                continue
+
+            for args in itertools.product(*params):
+                benchmark = cls()
+                try:
+                    if hasattr(benchmark, "setup"):
+                        benchmark.setup(*args)
+                except NotImplementedError:
+                    continue
+
+                value = measure(getattr(benchmark, name), args, repeat)
+                result = {"benchmark": fullname,
+                          "params": dict(zip(param_names, args)),
+                          "value": value,
+                          "unit": ("seconds" if name.startswith("time_")
+                                   else "bytes")}
+                results.append(result)
+                print(format_result(result), flush=True)
+
+    return results
+
+
+def format_result(result):
+    """Format result of a benchmark as a line of text."""
+    params = ", ".join("{}={}".format(k, v)
+                       for k, v in result["params"].items())
+    if result["unit"] == "seconds":
+        value = "{:10.4f} s ".format(result["value"])
+    else:
+        value = "{:10.1f} MB".format(result["value"] / 2**20)
+
+    return "{:50s} {:40s} {}".format(result["benchmark"], params, value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bench", "-b", default=None,
+                        help="regular expression of benchmarks to run")
+    parser.add_argument("--repeat", "-r", type=int, default=3,
+                        help="number of repetitions of time benchmarks")
+    parser.add_argument("--max-elements", type=float,
+                        default=common.MAX_ELEMENTS,
+                        help="skip benchmarks with more probabilities")
+    parser.add_argument("--json", default=None,
+                        help="file to which the results are written")
+    args = parser.parse_args(argv)
+
+    common.MAX_ELEMENTS = int(args.max_elements)
+    results = run(args.bench, repeat=args.repeat)
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
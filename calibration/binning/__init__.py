@@ -1,9 +1,13 @@
 from .general import BinningTree
 from .uniform import UniformBinning
 from .datadependent import DataDependentBinning
+from .cache import BinningCache
+from calibration.utils.instrument import instrument
 
 __all__ = [
     "BinningTree",
     "UniformBinning",
-    "DataDependentBinning"
+    "DataDependentBinning",
+    "BinningCache",
+    "instrument"
 ]
@@ -0,0 +1,145 @@
+import collections
+import copy
+import hashlib
+import weakref
+
+import numpy as np
+
+from calibration.utils import instrument
+from .general import BinningTree
+
+
+class BinningCache:
+    """
+    Least recently used cache of binning trees that are fit to the same
+    probabilities with the same binning scheme.
+
+    At most `maxsize` fitted trees (together with their bin numbers) are
+    kept. By default, probabilities are identified by the array object
+    itself, i.e., the cache assumes that arrays are not modified in place;
+    call `invalidate` after modifying them. If `hash_data` is `True`, they
+    are identified by a hash of their contents instead, which also finds
+    equal copies and modified arrays at the cost of reading all
+    probabilities once for every lookup.
+
+    The cache does not keep the probabilities alive: it only stores the
+    structure of the trees and their bin numbers, which requires memory for
+    two integers per data point. Without hashing, the trees of probabilities
+    are removed as soon as the probabilities are garbage collected.
+
+    Binning schemes are identified by their type and representation.
+    """
+
+    def __init__(self, maxsize=8, hash_data=False):
+        if maxsize < 1:
+            raise ValueError(
+                'Expected maximum size of at least 1 (got {})'.format(maxsize))
+
+        self.maxsize = maxsize
+        self.hash_data = hash_data
+        self.hits = 0
+        self.misses = 0
+
+        # fitted trees without probabilities and weak references to the
+        # probabilities they were fit to, ordered from least to most
+        # recently used
+        self._entries = collections.OrderedDict()
+
+    def fit(self, binning, probs):
+        """
+        Return binning tree of binning scheme `binning` that is fit to
+        probabilities `probs`, which shares its structure and bin numbers
+        with other calls with the same arguments.
+        """
+        key = self._key(binning, probs)
+        entry = self._entries.get(key)
+
+        # without hashing, entries are removed when their probabilities are
+        # garbage collected, and hence identities are not reused
+        if entry is not None and (self.hash_data or entry[0]() is probs):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            instrument.metric("cache_hit", True)
+            return self._attach(entry[1], probs)
+
+        self.misses += 1
+        instrument.metric("cache_hit", False)
+        tree = BinningTree(binning).fit(probs)
+
+        # bin numbers are computed once and shared as well
+        tree.binnumbers
+
+        cached_tree = copy.copy(tree)
+        cached_tree.probs = None
+        ref = None if self.hash_data else weakref.ref(
+            probs, self._finalizer(key[0]))
+        self._entries[key] = (ref, cached_tree)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+        return tree
+
+    def invalidate(self, probs=None):
+        """
+        Remove all binning trees that are fit to probabilities `probs`, or
+        all binning trees if `probs` is `None`.
+        """
+        if probs is None:
+            self._entries.clear()
+            return
+
+        self._remove(self._data_key(probs))
+
+    def clear(self):
+        """Remove all binning trees and reset the statistics."""
+        self.invalidate()
+        self.hits = 0
+        self.misses = 0
+
+    def _remove(self, data_key):
+        """Remove all binning trees of probabilities with key `data_key`."""
+        for key in [key for key in self._entries if key[0] == data_key]:
+            del self._entries[key]
+
+    def _finalizer(self, data_key):
+        """Return callback that removes the binning trees of probabilities
+        with key `data_key` from the cache, if it still exists."""
+        cache = weakref.ref(self)
+
+        def finalize(ref):
+            if cache() is not None:
+                cache()._remove(data_key)
+
+        return finalize
+
+    @staticmethod
+    def _attach(tree, probs):
+        """Return copy of cached binning tree `tree` with probabilities
+        `probs`."""
+        tree = copy.copy(tree)
+        tree.probs = probs if probs.ndim > 1 else np.stack(
+            [probs, 1-probs], axis=-1)
+        return tree
+
+    def _key(self, binning, probs):
+        """Return key of binning scheme `binning` and probabilities
+        `probs`."""
+        return (self._data_key(probs), type(binning), repr(binning))
+
+    def _data_key(self, probs):
+        """Return key of probabilities `probs`."""
+        if not self.hash_data:
+            return id(probs), probs.shape, probs.dtype.str
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr((probs.shape, probs.dtype.str)).encode())
+        digest.update(np.ascontiguousarray(probs).data)
+        return digest.hexdigest()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return "BinningCache(maxsize=%r, hash_data=%r)" % (self.maxsize,
+                                                           self.hash_data)
@@ -1,12 +1,13 @@
 import numpy as np
 
-from . import general
-
 
 class DataDependentBinning:
     """Binning tree that minimizes number of samples per bin by
     splitting along the axis with highest variance."""
 
+    # Bins depend on the data set
+    data_dependent = True
+
     def __init__(self, min_size=100, threshold="mean"):
         super(DataDependentBinning, self).__init__()
 
@@ -24,41 +25,107 @@ class DataDependentBinning:
             raise ValueError(
                 "'threshold' must be 'mean', 'median', or a function")
 
-    def split(self, parent, allprobs):
-        indices = parent.indices
+    def split(self, tree, allprobs):
+        N = allprobs.shape[0]
+
+        # Nodes that remain to be split, with the sums and sums of squares of
+        # their probabilities
+        queue = [(0, 0, N) + self._sums(allprobs, slice(None))]
+
+        while queue:
+            node, start, stop, sums, squares = queue.pop()
+            indices = tree.indices[start:stop]
+            n = stop - start
+
+            # Do not split if the number of samples is low
+            if n < self.min_size:
+                continue
+
+            # Split along axis with highest variance
+            split_axis = self._split_axis(allprobs, indices, sums, squares)
+            split_probs = allprobs[indices, split_axis]
+            split_threshold = self._threshold(split_probs)
+
+            # Do not split if all samples end up in one node
+            low_probs = split_probs < split_threshold
+            number_low_probs = np.count_nonzero(low_probs)
+            if number_low_probs == 0 or number_low_probs == n:
+                continue
+
+            # Accept split and move samples of low node to the front
+            low_indices = indices[low_probs]
+            high_indices = indices[~low_probs]
+            indices[:number_low_probs] = low_indices
+            indices[number_low_probs:] = high_indices
+
+            # Compute sums of the smaller node and derive the sums of the
+            # larger node
+            if number_low_probs <= n - number_low_probs:
+                low_sums, low_squares = self._sums(allprobs, low_indices)
+                high_sums = sums - low_sums
+                high_squares = squares - low_squares
+            else:
+                high_sums, high_squares = self._sums(allprobs, high_indices)
+                low_sums = sums - high_sums
+                low_squares = squares - high_squares
+
+            # Create children nodes and split the low node first
+            middle = start + number_low_probs
+            low_node, high_node = tree.split(node, split_axis, split_threshold,
+                                             [0, 1], [start, middle, stop])
+            queue.append((high_node, middle, stop, high_sums, high_squares))
+            queue.append((low_node, start, middle, low_sums, low_squares))
+
+        return tree
+
+    @staticmethod
+    def _split_axis(allprobs, indices, sums, squares):
+        """
+        Return axis with highest variance of the probabilities of samples
+        `indices` with sums `sums` and sums of squares `squares`.
+
+        Variances that are computed from the sums are subject to rounding
+        errors, and hence axes whose variances are almost equal, such as
+        both axes of binary probabilities, are compared by the variances of
+        the probabilities, which yields the lowest of axes with equal
+        variances.
+        """
         n = indices.size
-        probs = allprobs[indices]
+        variances = squares / n - (sums / n) ** 2
+        tolerance = 1e-9 * np.max(squares / n)
+        candidates = np.flatnonzero(variances >= np.max(variances) -
+                                    tolerance)
+        if candidates.size == 1:
+            return candidates[0]
 
-        # Do not split if the number of samples is low
-        if n < self.min_size:
-            return
+        probs = allprobs[indices[:, np.newaxis], candidates]
+        return candidates[np.argmax(np.var(probs, axis=0))]
 
-        # Split along axis with highest variance
-        split_axis = np.argmax(np.var(probs, axis=0))
-        split_probs = probs[:, split_axis]
-        split_threshold = self.threshold(split_probs)
+    def _threshold(self, split_probs):
+        """Compute threshold of probabilities `split_probs`."""
+        n = split_probs.size
 
-        # Do not split if all samples end up in one node
-        low_probs = split_probs < split_threshold
-        number_low_probs = np.sum(low_probs)
-        if number_low_probs == 0 or number_low_probs == n:
-            return
+        if self.threshold is np.median:
+            k = n // 2
+            if n % 2 == 1:
+                return np.partition(split_probs, k)[k]
 
-        # Accept split and create children nodes
-        parent.split_axis = split_axis
-        parent.split_threshold = split_threshold
+            low, high = np.partition(split_probs, [k - 1, k])[k - 1:k + 1]
+            return (low + high) / 2
 
-        low_node = general.BinningNode(indices[low_probs])
-        low_node.split_index = 0
-        low_node.parent = parent
-        self.split(low_node, allprobs)
+        return self.threshold(split_probs)
 
-        high_node = general.BinningNode(indices[~low_probs])
-        high_node.split_index = 1
-        high_node.parent = parent
-        self.split(high_node, allprobs)
+    @staticmethod
+    def _sums(allprobs, indices):
+        """Compute sums and sums of squares of probabilities of samples
+        `indices`.
 
-        return parent
+        The sums are accumulated in double precision, also for probabilities
+        of lower precision, since the variances are computed as differences
+        of them."""
+        probs = allprobs[indices]
+        return (np.sum(probs, axis=0, dtype=np.float64),
+                np.einsum('ij,ij->j', probs, probs, dtype=np.float64))
 
     def __repr__(self):
         return "DataDependentBinning(min_size=%r, threshold=%r)" \
@@ -1,10 +1,30 @@
 import numpy as np
-import anytree
+
+from calibration.utils import instrument
 
 
 class BinningTree:
     """General structure for binning samples by splitting their indices along
-    an axis."""
+    an axis.
+
+    The fitted tree is stored in flat arrays. All sample indices are kept in
+    a single permuted array `indices`, in which the samples of every node
+    form the contiguous range `indices[node_start[i]:node_stop[i]]`. The
+    remaining node arrays contain the parent `node_parent`, the index
+    `node_split_index` of the region of the parent that a node corresponds
+    to, the axis `split_axis` along which a node is split (`-1` for leaves),
+    and the row `split_threshold` of array `thresholds` that contains the
+    thresholds of the split (padded with `inf`). Children of a node are
+    stored consecutively starting at `first_child`.
+    """
+
+    # Version of the file format of `save`
+    FORMAT_VERSION = 1
+
+    # Arrays that describe the structure of a fitted tree
+    _ARRAYS = ("node_parent", "node_split_index", "node_start", "node_stop",
+               "split_axis", "split_threshold", "thresholds", "first_child",
+               "leaves", "offsets")
 
     def __init__(self, alg):
         self.alg = alg
@@ -12,45 +32,241 @@ class BinningTree:
 
     def fit(self, probs):
         """Fit binning tree to probabilities."""
-        # expand one-dimensional probability vectors
-        self.probs = probs if probs.ndim > 1 else np.stack(
-            [probs, 1-probs], axis=-1)
+        with instrument.stage("binning.fit"):
+            # expand one-dimensional probability vectors
+            self.probs = probs if probs.ndim > 1 else np.stack(
+                [probs, 1-probs], axis=-1)
 
-        # define root node with all samples and split it with binning algorithm
-        self.root = BinningNode(np.arange(self.probs.shape[0]))
-        self.alg.split(self.root, self.probs)
-        self.fitted = True
+            # define root node with all samples and split it with binning
+            # algorithm
+            nsamples, self.nclasses = self.probs.shape
+            self.indices = np.arange(nsamples)
+            self._nnodes = 1
+            self._nodes = [(np.array([-1]), np.array([0]), np.array([0]),
+                            np.array([nsamples]))]
+            self._splits = []
+            self._thresholds = []
+            with instrument.stage("split"):
+                self.alg.split(self, self.probs)
+            with instrument.stage("build"):
+                self._build()
+            self.fitted = True
+
+        # metrics are not part of the duration of the fit
+        if instrument.enabled():
+            instrument.metric("binning.fit/nbins", self.nbins)
+            instrument.metric("binning.fit/nnodes", self.split_axis.size)
+            instrument.metric("binning.fit/depth", self.depth)
 
         return self
 
+    def split(self, node, axis, threshold, split_indices, bounds):
+        """
+        Split node `node` along axis `axis` at threshold `threshold`.
+
+        The binning algorithm has to arrange the samples of node `node` in
+        array `indices` such that the samples of its `i`th child are given by
+        `indices[bounds[i]:bounds[i+1]]`. The `i`th child corresponds to
+        region `split_indices[i]` of the split, i.e., to the samples whose
+        value along axis `axis` is larger than or equal to exactly
+        `split_indices[i]` thresholds.
+
+        Return array with the ids of the children.
+        """
+        bounds = np.asarray(bounds)
+        nchildren = bounds.size - 1
+        return self.split_nodes(
+            np.array([node]), axis, np.reshape(threshold, (1, -1)),
+            np.full(nchildren, node), split_indices, bounds[:-1], bounds[1:])
+
+    def split_nodes(self, nodes, axis, thresholds, parents, split_indices,
+                    starts, stops):
+        """
+        Split nodes `nodes` along axes `axis` at thresholds `thresholds`.
+
+        This is the vectorized version of `split`. Axes `axis` should be a
+        scalar or an array of shape `(K,)`, and thresholds `thresholds` an
+        array of shape `(K, M)` or `(M,)`, where `K` is the number of nodes
+        and `M` the number of thresholds. The children are given by arrays
+        of their parents `parents`, split indices `split_indices`, and ranges
+        `starts` and `stops` in array `indices`; they have to be grouped by
+        parent and ordered by split index.
+
+        Return array with the ids of the children.
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        thresholds = np.asarray(thresholds, dtype=float)
+
+        # nodes with the same thresholds share them
+        if thresholds.ndim == 1:
+            rows = np.full(nodes.size, len(self._thresholds))
+            self._thresholds.append(thresholds)
+        else:
+            rows = len(self._thresholds) + np.arange(nodes.size)
+            self._thresholds.extend(thresholds)
+        self._splits.append((nodes, np.broadcast_to(axis, nodes.shape), rows))
+
+        nchildren = np.size(parents)
+        self._nodes.append((np.asarray(parents, dtype=np.int64),
+                            np.asarray(split_indices, dtype=np.int64),
+                            np.asarray(starts, dtype=np.int64),
+                            np.asarray(stops, dtype=np.int64)))
+        children = np.arange(self._nnodes, self._nnodes + nchildren)
+        self._nnodes += nchildren
+
+        return children
+
+    def _build(self):
+        """Assemble node arrays from the splits of the binning algorithm."""
+        (self.node_parent, self.node_split_index, self.node_start,
+         self.node_stop) = (np.concatenate(x) for x in zip(*self._nodes))
+
+        nnodes = self._nnodes
+        self.split_axis = np.full(nnodes, -1, dtype=np.int64)
+        self.split_threshold = np.full(nnodes, -1, dtype=np.int64)
+        for nodes, axis, rows in self._splits:
+            self.split_axis[nodes] = axis
+            self.split_threshold[nodes] = rows
+
+        nthresholds = max((x.size for x in self._thresholds), default=0)
+        self.thresholds = np.full((len(self._thresholds), nthresholds),
+                                  np.inf)
+        for row, thresholds in zip(self.thresholds, self._thresholds):
+            row[:thresholds.size] = thresholds
+
+        # children are stored consecutively after their parent was split
+        self.first_child = np.full(nnodes, -1, dtype=np.int64)
+        parents, first = np.unique(self.node_parent[1:], return_index=True)
+        self.first_child[parents] = first + 1
+        del self._nodes, self._splits, self._thresholds
+
+        # non-empty leaves, ordered by their position in array `indices`
+        leaves = np.flatnonzero((self.split_axis < 0) &
+                                (self.node_stop > self.node_start))
+        self.leaves = leaves[np.argsort(self.node_start[leaves],
+                                        kind="stable")]
+        self.offsets = np.append(self.node_start[self.leaves],
+                                 self.indices.size)
+        self._binnumbers = None
+
     @property
-    def binnumbers(self):
-        """Return array with bin numbers of each sample."""
+    def nbins(self):
+        """Return number of bins."""
+
+        if not self.fitted:
+            raise Exception("BinningTree fit needs to be called first")
+
+        return self.leaves.size
+
+    @property
+    def depth(self):
+        """Return depth of the binning tree."""
 
         if not self.fitted:
             raise Exception("BinningTree fit needs to be called first")
 
-        binnumbers = np.empty(self.probs.shape[0], dtype=np.int64)
-        for idx, node in enumerate(
-                anytree.PreOrderIter(self.root,
-                                     filter_=BinningNode.leaf_filter)):
-            binnumbers[node.indices] = idx
+        # move from all nodes to their parents, one level at a time
+        depth = 0
+        nodes = np.unique(self.node_parent[1:])
+        while nodes.size > 0:
+            depth += 1
+            nodes = self.node_parent[nodes]
+            nodes = np.unique(nodes[nodes >= 0])
 
-        return binnumbers
+        return depth
+
+    @property
+    def binnumbers(self):
+        """Return array with bin numbers of each sample."""
+
+        self._check_indices()
+
+        if self._binnumbers is None:
+            with instrument.stage("binning.binnumbers"):
+                self._binnumbers = np.empty(self.indices.size,
+                                            dtype=np.int64)
+                self._binnumbers[self.indices] = np.repeat(
+                    np.arange(self.nbins), np.diff(self.offsets))
+
+        return self._binnumbers
 
     @property
     def bins(self):
-        """Return list with sample indices of each bin."""
+        """Return list with sample indices of each bin.
+
+        The sample indices are views of array `indices`.
+        """
+
+        self._check_indices()
+
+        return np.split(self.indices, self.offsets[1:-1])
+
+    def predict(self, probs):
+        """
+        Return array with bin numbers of probabilities `probs`.
+
+        Probabilities `probs` should be an array of shape `(N,)` or `(N, C)`,
+        where `N` is the number of data points and `C` is the number of
+        targets of the probabilities to which the binning tree was fit. The
+        data points are routed through the tree with the stored splits, one
+        level at a time. Data points in regions without bins, i.e., without
+        any samples to which the binning tree was fit, are assigned bin
+        number `-1`.
+        """
 
         if not self.fitted:
             raise Exception("BinningTree fit needs to be called first")
 
-        bins = []
-        for node in anytree.PreOrderIter(self.root,
-                                         filter_=BinningNode.leaf_filter):
-            bins.append(node.indices)
+        # expand one-dimensional probability vectors
+        if probs.ndim == 1:
+            probs = np.stack([probs, 1-probs], axis=-1)
+
+        if probs.shape[1] != self.nclasses:
+            raise ValueError(
+                'Expected number of targets ({}) to match number of targets '
+                '({}).'.format(probs.shape[1], self.nclasses))
+
+        with instrument.stage("binning.predict"):
+            # children are identified by their parent and split index, and
+            # these keys are increasing with the ids of the nodes
+            nregions = self.thresholds.shape[1] + 1
+            keys = (self.first_child[self.node_parent[1:]] * nregions +
+                    self.node_split_index[1:])
+
+            # move all data points from the root to the leaves
+            nodes = np.zeros(probs.shape[0], dtype=np.int64)
+            samples = np.arange(probs.shape[0])
+            while samples.size > 0:
+                # stop at leaves
+                split_axis = self.split_axis[nodes[samples]]
+                internal = split_axis >= 0
+                samples = samples[internal]
+                split_axis = split_axis[internal]
+                parents = nodes[samples]
+
+                # compute split indices
+                values = probs[samples, split_axis]
+                rows = self.split_threshold[parents]
+                split_indices = np.zeros(samples.size, dtype=np.int64)
+                for i in range(nregions - 1):
+                    split_indices += values >= self.thresholds[rows, i]
+
+                # find children
+                parent_keys = (self.first_child[parents] * nregions +
+                               split_indices)
+                children = np.searchsorted(keys, parent_keys)
+                found = children < keys.size
+                found[found] = keys[children[found]] == parent_keys[found]
+                nodes[samples] = np.where(found, children + 1, -1)
+                samples = samples[found]
+
+            # obtain bin numbers of the leaves (the last entry is used for
+            # data points without node)
+            node_binnumbers = np.full(self.split_axis.size + 1, -1,
+                                      dtype=np.int64)
+            node_binnumbers[self.leaves] = np.arange(self.nbins)
 
-        return bins
+            return node_binnumbers[nodes]
 
     def bin_data(self, data=None):
         """
@@ -61,33 +277,78 @@ class BinningTree:
 
         If `data` is `None` (the default), `data` is set to the probabilities
         to which the binning tree was fit.
+
+        The data is reordered only once, and the returned arrays are views of
+        the reordered data.
         """
+        self._check_indices()
+
         if data is None:
+            if self.probs is None:
+                raise Exception("Probabilities of the loaded BinningTree are "
+                                "not available")
             data = self.probs
 
-        return [data[x] for x in self.bins]
+        with instrument.stage("binning.bin_data"):
+            return np.split(data[self.indices], self.offsets[1:-1])
 
+    def save(self, file, indices=True):
+        """
+        Save the fitted binning tree to file `file` in NumPy `.npz` format.
 
-class BinningNode(anytree.NodeMixin):
-    """Node for saving indices and boundaries."""
+        The structure and the thresholds of the tree are always saved, which
+        is sufficient for `predict`. If `indices` is `True` (the default), the
+        permuted sample indices are saved as well, so that the bins of the
+        samples to which the tree was fit are available after loading. The
+        binning algorithm itself is not saved, only its representation.
+        """
 
-    def __init__(self, indices):
-        super(BinningNode, self).__init__()
-        self.indices = indices
+        if not self.fitted:
+            raise Exception("BinningTree fit needs to be called first")
+
+        arrays = {name: getattr(self, name) for name in self._ARRAYS}
+        if indices and self.indices is not None:
+            arrays["indices"] = self.indices
 
-    def _post_attach(self, parent):
-        """Clear parent node."""
-        try:
-            parent.indices = None
-        except AttributeError:
-            pass
+        np.savez(file, version=self.FORMAT_VERSION, nclasses=self.nclasses,
+                 alg=repr(self.alg), **arrays)
+
+    @classmethod
+    def load(cls, file, alg=None):
+        """
+        Load a binning tree that was saved with `save` from file `file`.
 
-    @staticmethod
-    def leaf_filter(x):
-        if x.is_leaf:
-            try:
-                return x.indices.size > 0
-            except AttributeError:
-                return False
+        The arrays of the tree are read directly, without any further
+        processing. The binning algorithm is not saved but can be provided
+        as `alg`; the representation of the algorithm the tree was fit with
+        is available as `alg_repr`.
+        """
+        with np.load(file) as data:
+            version = int(data["version"])
+            if version > cls.FORMAT_VERSION:
+                raise ValueError('Expected file format version {} or lower '
+                                 '(got {})'.format(cls.FORMAT_VERSION,
+                                                   version))
+
+            tree = cls(alg)
+            for name in cls._ARRAYS:
+                setattr(tree, name, data[name])
+            tree.nclasses = int(data["nclasses"])
+            tree.indices = data["indices"] if "indices" in data else None
+            tree.alg_repr = str(data["alg"])
+
+        tree.probs = None
+        tree._binnumbers = None
+        tree.fitted = True
+
+        return tree
+
+    def _check_indices(self):
+        """Check that the sample indices of the fitted tree are available."""
+
+        if not self.fitted:
+            raise Exception("BinningTree fit needs to be called first")
 
-        return False
+        if self.indices is None:
+            raise Exception("Sample indices of the loaded BinningTree are not "
+                            "available")
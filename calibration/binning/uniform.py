@@ -1,46 +1,80 @@
 import numpy as np
 
-from ..binning import general
-
 
 class UniformBinning:
     """Partition probabilities into bins of uniform size."""
 
+    # Bins do not depend on the data set
+    data_dependent = False
+
     def __init__(self, bins=10):
         self.bins = np.linspace(start=0, stop=1, num=bins+1)[1:-1]
 
-    def split(self, parent, allprobs):
-        indices = parent.indices
+    def digitize(self, probs):
+        """
+        Return indices of the bins of probabilities `probs` along each axis.
 
-        # Do not split if no samples remaining
-        if indices.size == 0:
-            return
+        Probabilities `probs` should be an array of shape `(N, C)`, where `N`
+        is the number of data points and `C` is the number of targets. The
+        indices of the bins along the first `C-1` axes are returned as an
+        array of shape `(N, C-1)`.
+        """
+        N, C = probs.shape
+        digits = np.empty((N, max(C - 1, 0)),
+                          dtype=np.min_scalar_type(self.bins.size), order="F")
+        for axis in range(C - 1):
+            digits[:, axis] = np.digitize(probs[:, axis], self.bins)
 
-        # Increment axis along which samples are split
-        split_axis = 0 if parent.is_root else parent.parent.split_axis + 1
-        if split_axis + 1 >= allprobs.shape[-1]:
-            return
-        split_probs = allprobs[indices, split_axis]
+        return digits
 
-        # Obtain indices of every bin
-        split_nodes = np.digitize(split_probs, self.bins)
+    def split(self, tree, allprobs):
+        N, C = allprobs.shape
 
-        # Update parent node
-        parent.split_axis = split_axis
-        parent.split_threshold = self.bins
+        # Do not split if no samples or axes remaining
+        if N == 0 or C < 2:
+            return
+
+        # Sort samples lexicographically by the indices of their bins, which
+        # corresponds to a pre-order traversal of the binning tree
+        digits = self.digitize(allprobs)
+        order = np.lexsort(self._pack(digits)[::-1])
+        tree.indices[:] = tree.indices[order]
 
-        # Create child nodes
-        for i in range(self.bins.size+1):
-            split_indices = indices[split_nodes == i]
+        # Split all nodes of the same depth at once: samples whose indices
+        # along the previous axes agree belong to the same node
+        nodes = np.zeros(1, dtype=np.int64)
+        starts = np.zeros(1, dtype=np.int64)
+        newnode = np.zeros(N, dtype=bool)
+        newnode[0] = True
+        for split_axis in range(C - 1):
+            split_digits = digits[order, split_axis]
+            newnode[1:] |= split_digits[1:] != split_digits[:-1]
 
-            if split_indices.size > 0:
-                node = general.BinningNode(split_indices)
-                node.split_index = i
-                node.parent = parent
+            child_starts = np.flatnonzero(newnode)
+            child_stops = np.append(child_starts[1:], N)
+            parents = nodes[np.searchsorted(starts, child_starts,
+                                            side="right") - 1]
 
-                self.split(node, allprobs)
+            nodes = tree.split_nodes(nodes, split_axis, self.bins, parents,
+                                     split_digits[child_starts], child_starts,
+                                     child_stops)
+            starts = child_starts
 
         return self
 
+    def _pack(self, digits):
+        """Pack indices of bins into as few integer keys as possible."""
+        base = self.bins.size + 1
+        ndigits = 62 // max(int(np.ceil(np.log2(base))), 1)
+        keys = []
+        for i in range(0, digits.shape[1], ndigits):
+            key = np.zeros(digits.shape[0], dtype=np.int64)
+            for axis in range(i, min(i + ndigits, digits.shape[1])):
+                key *= base
+                key += digits[:, axis]
+            keys.append(key)
+
+        return keys
+
     def __repr__(self):
-        return "UniformBinning(bins=%r)" % (self.bins.size() - 1)
+        return "UniformBinning(bins=%r)" % (self.bins.size + 1)
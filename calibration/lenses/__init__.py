@@ -1,6 +1,7 @@
 from .group import group_lens, GroupLens
 from .max import maximum_lens, MaximumLens
 from .top2 import top2_lens, Top2Lens
+from .topk import topk_lens, TopKLens
 
 __all__ = [
     "group_lens",
@@ -8,5 +9,7 @@ __all__ = [
     "maximum_lens",
     "MaximumLens",
     "top2_lens",
-    "Top2Lens"
+    "Top2Lens",
+    "topk_lens",
+    "TopKLens"
 ]
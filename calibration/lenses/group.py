@@ -1,21 +1,44 @@
+import functools
+
 import numpy as np
 
+from calibration.utils.chunks import chunk_slices, map_chunks
+from calibration.sparse import TopKProbs
+
 
-def group_lens(probs, y, groups, check_groups=True):
+def group_lens(probs, y, groups, check_groups=True, chunksize=None):
     """
     Group probabilities `probs` and corresponding targets `y` into different
     `groups`.
 
     Probabilities `probs` should be an array of shape `(N, C)`, where `N` is
-    the number of data points and `C` is the number of targets. Targets `y`
-    should be an array of shape `(N,)` or `(N, C)`. If `y` is an array of
-    shape `(N, C)` each row represents a one-hot encoded target. Groups
-    `groups` should be a list of arrays that represent non-overlapping groups
-    of targets.
+    the number of data points and `C` is the number of targets, or sparse
+    probabilities of type `TopKProbs`. Targets `y` should be an array of shape
+    `(N,)` or `(N, C)`. If `y` is an array of shape `(N, C)` each row
+    represents a one-hot encoded target. Groups `groups` should be a list of
+    arrays that represent non-overlapping groups of targets.
+
+    The probability of a group of sparse probabilities is the sum of the
+    stored probabilities of its targets and its share of the remaining
+    probability mass. Thereby every target is assigned to one group in the
+    same way as the labels of targets `y`, which only differs from the
+    dense probabilities if the groups do not cover all targets exactly.
 
     If `check_groups` is `True` (the default), it is checked if the
     provided `groups` cover all targets exactly.
+
+    If `chunksize` is not `None`, the data is processed in chunks of at most
+    `chunksize` data points, and hence only intermediate arrays of this size
+    are allocated. This allows to use memory-mapped arrays as inputs.
     """
+    _check_dims(probs, y)
+
+    return _group(probs, y, _Grouping(groups, probs.shape[1], check_groups),
+                  chunksize=chunksize)
+
+
+def _check_dims(probs, y):
+    """Check dimensions of probabilities `probs` and targets `y`."""
     # check dimensions of predictions
     dim = probs.ndim
     if dim != 2:
@@ -37,43 +60,128 @@ def group_lens(probs, y, groups, check_groups=True):
     if y.ndim > 2:
         raise ValueError('Expected 1 or 2 dimensions (got {})'.format(y.ndim))
 
-    # check if provided groups cover all targets
-    if check_groups:
-        group_sum = sum(x.size for x in groups)
-        if group_sum != C:
-            raise ValueError('Expected number of targets in groups ({}) to '
-                             'match total number of targets ({}).'
-                             .format(group_sum, C))
 
-        notcovered = np.setdiff1d(np.arange(C), np.concatenate(groups))
-        if notcovered.size > 0:
-            raise ValueError('Expected all targets to be covered by groups '
-                             '({} not covered).'
-                             .format(notcovered.size, C))
+def _group(probs, y, grouping, chunksize=None):
+    """Group probabilities `probs` and targets `y` with `grouping`."""
+    # process data in chunks
+    if chunksize is not None and probs.shape[0] > chunksize:
+        return map_chunks(functools.partial(_group, grouping=grouping),
+                          chunksize, probs, y)
 
     # compute probabilities of different groups
-    probs_groups = np.stack([np.sum(probs[:, group], axis=1)
-                             for group in groups], axis=1)
+    probs_groups = grouping.sum(probs)
 
     # compute outcomes in each group: if the true outcome
     # is in the kth group, set the new label to k,
     # corresponding to the columns in the
     # probability vector.
     if y.ndim == 1:
-        y_groups = np.zeros_like(y)
-        for i, group in enumerate(groups):
-            y_groups[np.isin(y, group)] = i
+        y_groups = grouping.mapping[y].astype(y.dtype)
     else:
-        y_groups = np.stack([np.sum(y[:, group], axis=1)
-                             for group in groups], axis=1)
+        y_groups = grouping.sum(y)
 
     return probs_groups, y_groups
 
 
+class _Grouping:
+    """
+    Precomputed groups `groups` of `nclasses` targets.
+
+    Array `mapping` contains the group of each target, and the columns of
+    the targets are summed up in all groups simultaneously in as many steps
+    as the largest group contains targets.
+    """
+
+    def __init__(self, groups, nclasses, check_groups=True):
+        groups = [np.asarray(group, dtype=np.int64).ravel()
+                  for group in groups]
+
+        # check if provided groups cover all targets
+        if check_groups:
+            group_sum = sum(x.size for x in groups)
+            if group_sum != nclasses:
+                raise ValueError('Expected number of targets in groups ({}) '
+                                 'to match total number of targets ({}).'
+                                 .format(group_sum, nclasses))
+
+            notcovered = np.setdiff1d(np.arange(nclasses),
+                                      np.concatenate(groups))
+            if notcovered.size > 0:
+                raise ValueError('Expected all targets to be covered by '
+                                 'groups ({} not covered).'
+                                 .format(notcovered.size, nclasses))
+
+        self.nclasses = nclasses
+        self.ngroups = len(groups)
+
+        # targets that are not covered are assigned to the first group, and
+        # targets in multiple groups to the last one
+        self.mapping = np.zeros(nclasses, dtype=np.int64)
+        for i, group in enumerate(groups):
+            self.mapping[group] = i
+
+        # the `j`th targets of all groups that contain at least `j + 1`
+        # targets
+        sizes = np.array([x.size for x in groups], dtype=np.int64)
+        starts = np.cumsum(sizes) - sizes
+        order = np.concatenate(groups) if groups else \
+            np.empty(0, dtype=np.int64)
+        self.steps = []
+        for j in range(sizes.max(initial=0)):
+            step_groups = np.flatnonzero(sizes > j)
+            self.steps.append((step_groups, order[starts[step_groups] + j]))
+
+    def sum(self, x):
+        """Return sums of the columns of array `x` in each group."""
+        if isinstance(x, TopKProbs):
+            return self._sum_topk(x)
+
+        # same data type as `np.sum`
+        dtype = np.zeros(0, dtype=x.dtype).sum().dtype
+
+        # the columns of each group are added one after another, which
+        # yields the same results as `np.sum` for small groups; all groups
+        # are processed simultaneously for blocks of data points that fit
+        # into the cache
+        out = np.empty((x.shape[0], self.ngroups), dtype=dtype)
+        blocksize = max(64, 2**18 // max(self.nclasses, 1))
+        for s in chunk_slices(x.shape[0], blocksize):
+            xt = x[s].T
+            block = np.zeros((self.ngroups, xt.shape[1]), dtype=dtype)
+            for step_groups, step_targets in self.steps:
+                if step_groups.size == self.ngroups:
+                    block += xt[step_targets]
+                else:
+                    block[step_groups] += xt[step_targets]
+            out[s] = block.T
+
+        return out
+
+
+    def _sum_topk(self, probs):
+        """Return probabilities of sparse probabilities `probs` of type
+        `TopKProbs` in each group."""
+        N = probs.indices.shape[0]
+        residual_value = probs.residual_value
+
+        # spread the remaining probability mass over the targets of each
+        # group, and add the stored probabilities in excess of it
+        sizes = np.bincount(self.mapping, minlength=self.ngroups)
+        out = residual_value[:, np.newaxis] * sizes
+        keys = (np.arange(N)[:, np.newaxis] * self.ngroups +
+                self.mapping[probs.indices])
+        out += np.bincount(
+            keys.ravel(),
+            weights=(probs.values - residual_value[:, np.newaxis]).ravel(),
+            minlength=N * self.ngroups).reshape(N, self.ngroups)
+
+        return out.astype(probs.values.dtype, copy=False)
+
+
 class GroupLens:
 
     def __init__(self, groups=None, nclasses=None, ngroups=None,
-                 check_groups=True):
+                 check_groups=True, chunksize=None):
         if nclasses and ngroups:
             self.groups = np.array_split(np.arange(nclasses), ngroups)
         elif groups:
@@ -84,11 +192,25 @@ class GroupLens:
                 'numbers of groups')
 
         self.check_groups = check_groups
+        self.chunksize = chunksize
+
+        # groups are checked and precomputed only once for each number of
+        # targets
+        self._grouping = None
+        if nclasses:
+            self._grouping = _Grouping(self.groups, nclasses,
+                                       check_groups=check_groups)
 
     def __call__(self, probs, y):
-        return group_lens(probs, y, self.groups,
-                          check_groups=self.check_groups)
+        _check_dims(probs, y)
+
+        nclasses = probs.shape[1]
+        if self._grouping is None or self._grouping.nclasses != nclasses:
+            self._grouping = _Grouping(self.groups, nclasses,
+                                       check_groups=self.check_groups)
+
+        return _group(probs, y, self._grouping, chunksize=self.chunksize)
 
     def __repr__(self):
-        return "GroupLens(groups=%r, check_groups=%r)" % (self.groups,
-                                                          self.check_groups)
+        return "GroupLens(groups=%r, check_groups=%r, chunksize=%r)" % (
+            self.groups, self.check_groups, self.chunksize)
@@ -1,7 +1,10 @@
 import numpy as np
 
+from calibration.utils.chunks import map_chunks
+from calibration.sparse import TopKProbs
 
-def maximum_lens(probs, y):
+
+def maximum_lens(probs, y, chunksize=None):
     """
     Extract the most confident predictions from probabilities `probs` with
     corresponding targets `y`.
@@ -10,12 +13,18 @@ def maximum_lens(probs, y):
     where `N` is the number of data points and `C` is the number of targets.
     If `probs` is a vector of shape `(N,)`, its entries are interpreted as
     the probabilities of the first target in a binary classification problem.
-    Targets `y` should be an array of shape `(N,)` or `(N, C)`. If `y` is an
-    array of shape `(N, C)`, each row represents a one-hot encoded target.
+    Probabilities `probs` can also be sparse probabilities of type
+    `TopKProbs`. Targets `y` should be an array of shape `(N,)` or `(N, C)`.
+    If `y` is an array of shape `(N, C)`, each row represents a one-hot
+    encoded target.
 
     In the reduced data set, for each data point the new target `0`
     corresponds to the old target of the most confident prediction, and target
     `1` to the set of all other targets.
+
+    If `chunksize` is not `None`, the data is processed in chunks of at most
+    `chunksize` data points, and hence only intermediate arrays of this size
+    are allocated. This allows to use memory-mapped arrays as inputs.
     """
     # check dimensions of predictions
     dim = probs.ndim
@@ -40,13 +49,21 @@ def maximum_lens(probs, y):
     if y.ndim > 2:
         raise ValueError('Expected 1 or 2 dimensions (got {})'.format(y.ndim))
 
+    # process data in chunks
+    if chunksize is not None and N > chunksize:
+        return map_chunks(maximum_lens, chunksize, probs, y)
+
     # compute most confident predictions
     if dim == 1:
-        max_idxs = (probs < 0.5).astype(np.int)
+        max_idxs = (probs < 0.5).astype(int)
         max_probs = np.maximum(probs, 1-probs)
     else:
-        max_idxs = np.argmax(probs, axis=1)
-        _max_probs = probs[np.arange(N), max_idxs]
+        if isinstance(probs, TopKProbs):
+            max_idxs = probs.indices[:, 0]
+            _max_probs = probs.values[:, 0]
+        else:
+            max_idxs = np.argmax(probs, axis=1)
+            _max_probs = probs[np.arange(N), max_idxs]
 
         # expand one-dimensional probability vector
         max_probs = np.stack([_max_probs, 1-_max_probs], axis=1)
@@ -66,8 +83,11 @@ def maximum_lens(probs, y):
 
 class MaximumLens:
 
+    def __init__(self, chunksize=None):
+        self.chunksize = chunksize
+
     def __call__(self, probs, y):
-        return maximum_lens(probs, y)
+        return maximum_lens(probs, y, chunksize=self.chunksize)
 
     def __repr__(self):
-        return "MaximumLens()"
+        return "MaximumLens(chunksize=%r)" % self.chunksize
@@ -0,0 +1,109 @@
+import functools
+
+import numpy as np
+
+from calibration.utils.chunks import map_chunks
+from calibration.sparse import TopKProbs
+
+
+def topk_lens(probs, y, k, chunksize=None):
+    """
+    Extract the `k` most confident predictions from probabilities `probs`
+    with corresponding targets `y`.
+
+    Probabilities `probs` should be an array of shape `(N, C)`, where `N` is
+    the number of data points and `C` is the number of targets, or sparse
+    probabilities of type `TopKProbs` with at least `k` targets per data
+    point. Targets `y` should be an array of shape `(N,)` or `(N, C)`. If `y`
+    is an array of shape `(N, C)` each row represents a one-hot encoded
+    target.
+
+    In the reduced data set, for each data point the new target `i` (for
+    `i < k`) corresponds to the old target of the `i+1`th most confident
+    prediction, and target `k` to the set of all other targets.
+
+    If `chunksize` is not `None`, the data is processed in chunks of at most
+    `chunksize` data points, and hence only intermediate arrays of this size
+    are allocated. This allows to use memory-mapped arrays as inputs.
+    """
+    # check dimensions of predictions
+    dim = probs.ndim
+    if dim != 2:
+        raise ValueError('Expected 2 dimensions (got {})'.format(dim))
+
+    # obtain batch size and number of targets
+    N, C = probs.shape
+
+    if k < 1 or k > C:
+        raise ValueError(
+            'Expected number of predictions between 1 and {} (got {})'
+            .format(C, k))
+
+    # check dimensions of targets
+    if y.shape[0] != N:
+        raise ValueError('Expected batch_size ({}) to match batch_size ({}).'
+                         .format(y.shape[0], N))
+
+    if y.ndim == 2 and y.shape[1] != C:
+        raise ValueError(
+            'Expected number of targets ({}) to match number of targets ({}).'
+            .format(y.shape[1], N))
+
+    if y.ndim > 2:
+        raise ValueError('Expected 1 or 2 dimensions (got {})'.format(y.ndim))
+
+    # process data in chunks
+    if chunksize is not None and N > chunksize:
+        return map_chunks(functools.partial(topk_lens, k=k), chunksize,
+                          probs, y)
+
+    # compute the `k` most confident predictions, sorted by decreasing
+    # probability, and the remaining probability mass
+    if isinstance(probs, TopKProbs):
+        if probs.k < k:
+            raise ValueError('Expected at least {} targets per data point '
+                             '(got {})'.format(k, probs.k))
+
+        top_probs = np.empty((N, k + 1), dtype=probs.values.dtype)
+        top_idxs = probs.indices[:, :k]
+        top_probs[:, :k] = probs.values[:, :k]
+    else:
+        top_probs = np.empty((N, k + 1), dtype=probs.dtype)
+
+        # only the `k` largest entries of each row are sorted
+        top_idxs = np.argpartition(probs, C - k, axis=1)[:, C - k:]
+        _top_probs = np.take_along_axis(probs, top_idxs, axis=1)
+        order = np.argsort(-_top_probs, axis=1, kind="stable")
+        top_idxs = np.take_along_axis(top_idxs, order, axis=1)
+        top_probs[:, :k] = np.take_along_axis(_top_probs, order, axis=1)
+
+    np.sum(top_probs[:, :k], axis=1, out=top_probs[:, k])
+    np.subtract(1, top_probs[:, k], out=top_probs[:, k])
+
+    # compute new targets:
+    # if the `i+1`th most confident prediction matches the true outcome,
+    # set the label to `i`, and otherwise to `k`
+    if y.ndim == 1:
+        top_y = np.full(N, k, dtype=y.dtype)
+        rows, cols = np.nonzero(top_idxs == y[:, np.newaxis])
+        top_y[rows] = cols
+    else:
+        top_y = np.empty((N, k + 1), dtype=y.dtype)
+        top_y[:, :k] = np.take_along_axis(np.asarray(y), top_idxs, axis=1)
+        np.sum(top_y[:, :k], axis=1, out=top_y[:, k])
+        np.subtract(1, top_y[:, k], out=top_y[:, k])
+
+    return top_probs, top_y
+
+
+class TopKLens:
+
+    def __init__(self, k, chunksize=None):
+        self.k = k
+        self.chunksize = chunksize
+
+    def __call__(self, probs, y):
+        return topk_lens(probs, y, self.k, chunksize=self.chunksize)
+
+    def __repr__(self):
+        return "TopKLens(k=%r, chunksize=%r)" % (self.k, self.chunksize)
@@ -1,9 +1,12 @@
 from .consistent import consistent_targets, ConsistentTargets
-from .resample import resample_stats, ResampleStats
+from .resample import resample_stats, resample_counts, ResampleStats
+from .parallel import map_replicates
 
 __all__ = [
     "consistent_targets",
     "ConsistentTargets",
     "resample_stats",
-    "ResampleStats"
+    "resample_counts",
+    "ResampleStats",
+    "map_replicates"
 ]
@@ -1,13 +1,20 @@
 import numpy as np
 
+from calibration.utils.rng import check_rng, uniform
 
-def consistent_targets(probs):
+
+def consistent_targets(probs, rng=None):
     """
     Sample consistent targets with probabilities `probs`.
 
     Probabilities have to be specified in shape `(N, C)`, where `N` is the
     batch size and `C` is the number of targets. Targets are sampled from
     `(0, ..., C-1)` and returned in shape `(N)`.
+
+    If random number generator `rng` is `None` (the default), the global
+    random state is used. Otherwise `rng` can be an integer, a
+    `np.random.SeedSequence`, a `np.random.BitGenerator`, or a
+    `np.random.Generator` (see `check_rng`).
     """
     dim = probs.ndim
     if dim != 2:
@@ -17,17 +24,21 @@ def consistent_targets(probs):
     if C < 2:
         raise ValueError('Expected 2 or more classes (got {})'.format(C))
 
+    rng = check_rng(rng)
     if C == 2:
-        return (np.random.uniform(size=N) < probs[:, 1]).astype(int)
+        return (uniform(rng, size=N) < probs[:, 1]).astype(int)
 
-    return (np.random.uniform(size=(N, 1)) < np.cumsum(probs, axis=1)).argmax(
+    return (uniform(rng, size=(N, 1)) < np.cumsum(probs, axis=1)).argmax(
         axis=1)
 
 
 class ConsistentTargets:
 
+    def __init__(self, rng=None):
+        self.rng = check_rng(rng)
+
     def __call__(self, probs):
-        return consistent_targets(probs)
+        return consistent_targets(probs, rng=self.rng)
 
     def __repr__(self):
-        return "ConsistentTargets()"
+        return "ConsistentTargets(rng=%r)" % self.rng
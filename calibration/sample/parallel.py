@@ -0,0 +1,97 @@
+import os
+import concurrent.futures
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from calibration.utils.rng import spawn_rngs
+
+
+def map_replicates(func, *data, n=1000, n_jobs=None, rng=None):
+    """
+    Evaluate function `func` for `n` replicates of data set `data`.
+
+    Function `func` is called as `func(rngs, *data)` with a list `rngs` of
+    random number generators, one for every replicate, and has to return a
+    list with one result per generator. The generators are spawned from
+    random number generator `rng` (see `spawn_rngs`), which can be `None`,
+    an integer, a `np.random.SeedSequence`, a `np.random.BitGenerator`, or a
+    `np.random.Generator`. Every replicate should draw its random numbers
+    from its own generator, so that results do not depend on how the
+    replicates are split up.
+
+    If `n_jobs` is `None` (the default), all replicates are evaluated in the
+    current process. Otherwise they are evaluated in a pool of `n_jobs`
+    processes (all CPUs if `n_jobs` is `-1`). The arrays in `data` are copied
+    to shared memory once, and only `func` and the generators are sent to
+    the processes.
+    """
+    rngs = spawn_rngs(rng, n)
+
+    if n_jobs is None or n_jobs == 1 or n <= 1:
+        return func(rngs, *data)
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    if n_jobs < 1:
+        raise ValueError(
+            "'n_jobs' must be None, -1, or a positive number (got {})"
+            .format(n_jobs))
+
+    # split up replicates in a few tasks per process to balance the load
+    ntasks = min(n, 4 * n_jobs)
+    bounds = np.linspace(0, n, ntasks + 1).astype(int)
+
+    shared = [_SharedArray(x) for x in data]
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=n_jobs, initializer=_attach,
+                initargs=([x.spec for x in shared],)) as executor:
+            tasks = [executor.submit(_evaluate, func, rngs[start:stop])
+                     for start, stop in zip(bounds[:-1], bounds[1:])]
+            out = []
+            for task in tasks:
+                out.extend(task.result())
+    finally:
+        for x in shared:
+            x.release()
+
+    return out
+
+
+class _SharedArray:
+    """Copy of an array in shared memory."""
+
+    def __init__(self, array):
+        array = np.asarray(array)
+        self.memory = shared_memory.SharedMemory(create=True,
+                                                 size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype,
+                   buffer=self.memory.buf)[...] = array
+        self.spec = (self.memory.name, array.shape, array.dtype.str)
+
+    def release(self):
+        self.memory.close()
+        self.memory.unlink()
+
+
+# shared memory and data of the worker processes
+_memory = []
+_data = ()
+
+
+def _attach(specs):
+    """Attach worker process to shared data."""
+    global _data
+
+    data = []
+    for name, shape, dtype in specs:
+        memory = shared_memory.SharedMemory(name=name)
+        _memory.append(memory)
+        data.append(np.ndarray(shape, dtype=dtype, buffer=memory.buf))
+    _data = tuple(data)
+
+
+def _evaluate(func, rngs):
+    """Evaluate replicates in a worker process."""
+    return func(rngs, *_data)
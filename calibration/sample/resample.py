@@ -1,9 +1,21 @@
+import functools
+
 import numpy as np
 
+from calibration.utils.rng import check_rng, randint
+from .parallel import map_replicates
+
 
-def resample_stats(stats, *data, n=1000):
+def resample_stats(stats, *data, n=1000, n_jobs=None, rng=None):
     """
     Resample data set `data` `n` times and evaluate statistic `stats`.
+
+    If `n_jobs` and `rng` are `None` (the default), the data set is
+    resampled with the global random state. Otherwise every resampled data
+    set is generated with its own random number generator spawned from
+    random number generator `rng`, and the statistics are evaluated in a
+    pool of `n_jobs` processes (see `map_replicates`). The results do not
+    depend on `n_jobs`.
     """
     N = data[0].shape[0]
 
@@ -13,10 +25,24 @@ def resample_stats(stats, *data, n=1000):
                 'Expected batch_size ({}) to match batch_size ({}).'
                 .format(data[i].shape[0], N))
 
+    if n_jobs is not None or rng is not None:
+        return map_replicates(functools.partial(_resample_stats, stats),
+                              *data, n=n, n_jobs=n_jobs, rng=rng)
+
+    return _resample_stats(stats, [None] * n, *data)
+
+
+def _resample_stats(stats, rngs, *data):
+    """Resample data set `data` with each random number generator in `rngs`
+    and evaluate statistic `stats`.
+
+    If a generator is `None`, the global random state is used."""
+    N = data[0].shape[0]
+
     out = []
-    for _ in range(n):
+    for rng in rngs:
         # Resample
-        indices = np.random.randint(0, N, size=(N,))
+        indices = randint(rng, N, size=(N,))
 
         # Compute statistics
         out.append(stats(*(d[indices] for d in data)))
@@ -24,14 +50,36 @@ def resample_stats(stats, *data, n=1000):
     return out
 
 
+def resample_counts(rngs, N):
+    """
+    Return array of shape `(len(rngs), N)` with the number of times each of
+    `N` data points is drawn in the resampled data sets of random number
+    generators `rngs`.
+
+    The data points are drawn in the same way as in `resample_stats`. If a
+    generator is `None`, the global random state is used.
+    """
+    m = len(rngs)
+    draws = np.empty((m, N), dtype=np.int64)
+    for i, rng in enumerate(rngs):
+        draws[i] = randint(rng, N, size=(N,))
+    draws += N * np.arange(m)[:, np.newaxis]
+
+    return np.bincount(draws.ravel(), minlength=m * N).reshape(m, N)
+
+
 class ResampleStats:
 
-    def __init__(self, stats, n=1000):
+    def __init__(self, stats, n=1000, n_jobs=None, rng=None):
         self.stats = stats
         self.n = n
+        self.n_jobs = n_jobs
+        self.rng = check_rng(rng)
 
     def __call__(self, *data):
-        return resample_stats(self.stats, *data, n=self.n)
+        return resample_stats(self.stats, *data, n=self.n, n_jobs=self.n_jobs,
+                              rng=self.rng)
 
     def __repr__(self):
-        return "ResampleStats(stats=%r, n=%r)" % (self.stats, self.n)
+        return "ResampleStats(stats=%r, n=%r, n_jobs=%r, rng=%r)" % (
+            self.stats, self.n, self.n_jobs, self.rng)
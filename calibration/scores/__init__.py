@@ -1,6 +1,7 @@
 from .logarithmic import logarithmic_score, LogarithmicScore
 from .quadratic import quadratic_score, QuadraticScore
 from .spherical import spherical_score, SphericalScore
+from .bootstrap import bootstrap_score, BootstrapScore
 
 __all__ = [
     "logarithmic_score",
@@ -8,5 +9,7 @@ __all__ = [
     "quadratic_score",
     "QuadraticScore",
     "spherical_score",
-    "SphericalScore"
+    "SphericalScore",
+    "bootstrap_score",
+    "BootstrapScore"
 ]
@@ -0,0 +1,96 @@
+import functools
+
+import numpy as np
+
+from calibration.sample import map_replicates, resample_counts
+from calibration.utils.rng import check_rng
+from .quadratic import quadratic_score
+
+
+def bootstrap_score(probs, y, score=quadratic_score, n=1000, level=0.95,
+                    max_elements=2**24, rng=None):
+    """
+    Evaluate scoring rule `score` for probabilities `probs` with
+    corresponding targets `y` and estimate a percentile confidence interval
+    of level `level` with `n` bootstrap samples.
+
+    Probabilities `probs` should be of shape `(N, C)` or `(M, N, C)`, and
+    targets `y` of shape `(N,)` (see `quadratic_score`). Scoring rule `score`
+    should be a function such as `logarithmic_score` that returns the scores
+    of the individual data points if it is called with `per_sample=True`;
+    the scores of the individual data points have to be finite.
+
+    Since a score is the mean of the scores of the individual data points,
+    they are evaluated only once, and the score of a bootstrap sample is
+    their mean weighted with the number of times each data point is drawn.
+    The bootstrap samples are evaluated in chunks, each of which contains as
+    many bootstrap samples as fit into `max_elements` (by default `2**24`)
+    resampled data points, but at least one bootstrap sample.
+
+    If `rng` is not `None`, every bootstrap sample is generated with its own
+    random number generator spawned from random number generator `rng` (see
+    `resample_stats`). Otherwise the data points are drawn in the same way
+    as in `resample_stats` with the global random state.
+
+    Return the score and an array with the lower and upper bound of the
+    confidence interval.
+    """
+    per_sample = score(probs, y, per_sample=True)
+    orig_score = np.mean(per_sample, axis=-1)
+
+    # compute scores of the bootstrap samples
+    bootstrap = functools.partial(_bootstrap_score, max_elements)
+    if rng is None:
+        samples = bootstrap([None] * n, per_sample.T)
+    else:
+        samples = map_replicates(bootstrap, per_sample.T, n=n, rng=rng)
+
+    # compute percentile confidence interval
+    alpha = 100 * (1 - level) / 2
+    interval = np.percentile(samples, [alpha, 100 - alpha], axis=0)
+
+    return orig_score, interval
+
+
+def _bootstrap_score(max_elements, rngs, per_sample):
+    """
+    Evaluate scores of bootstrap samples as weighted means of the scores
+    `per_sample` of the individual data points.
+
+    One bootstrap sample is evaluated for every random number generator in
+    `rngs`. If a generator is `None`, the global random state is used.
+    """
+    n = len(rngs)
+    N = per_sample.shape[0]
+
+    # number of bootstrap samples per chunk
+    nchunk = max(1, max_elements // max(N, 1))
+
+    samples = []
+    for start in range(0, n, nchunk):
+        counts = resample_counts(rngs[start:start + nchunk], N)
+        samples.extend(np.dot(counts, per_sample) / N)
+
+    return samples
+
+
+class BootstrapScore:
+
+    def __init__(self, score=quadratic_score, n=1000, level=0.95,
+                 max_elements=2**24, rng=None):
+        self.score = score
+        self.n = n
+        self.level = level
+        self.max_elements = max_elements
+        self.rng = check_rng(rng)
+
+    def __call__(self, probs, y):
+        return bootstrap_score(probs, y, score=self.score, n=self.n,
+                               level=self.level,
+                               max_elements=self.max_elements,
+                               rng=self.rng)
+
+    def __repr__(self):
+        return ("BootstrapScore(score=%r, n=%r, level=%r, max_elements=%r, "
+                "rng=%r)" % (self.score, self.n, self.level,
+                             self.max_elements, self.rng))
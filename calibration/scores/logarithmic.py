@@ -1,34 +1,67 @@
+import functools
+
 import numpy as np
 
+from calibration.utils.chunks import score_chunks
+from calibration.sparse import target_probs
+
 
-def logarithmic_score(probs, y):
+def logarithmic_score(probs, y, chunksize=None, per_sample=False, clip=None):
     """
     Evaluate the logarithmic score of the probabilities `probs` with
     corresponding targets `y`.
 
     Probabilities `probs` should be of shape `(N, C)`, where `N` is the batch
-    size and `C` is the number of targets. Targets `y` should be of shape
-    `(N,)`.
+    size and `C` is the number of targets, or sparse probabilities of type
+    `TopKProbs`. Targets `y` should be of shape `(N,)`.
+
+    Probabilities `probs` can also be of shape `(M, N, C)`, such as the
+    predictions of `M` models for the same data points, in which case an
+    array with the `M` scores is returned.
+
+    If `per_sample` is `True`, the scores of the individual data points are
+    returned instead of their mean.
+
+    If `clip` is not `None`, probabilities of the targets smaller than `clip`
+    are set to `clip`, so that the score is finite.
+
+    If `chunksize` is not `None`, the data is processed in chunks of at most
+    `chunksize` data points, and hence only intermediate arrays of this size
+    are allocated. This allows to use memory-mapped arrays as inputs.
     """
     # check dimensions
     dim = probs.ndim
-    if dim != 2:
-        raise ValueError('Expected 2 dimensions (got {})'.format(dim))
+    if dim not in (2, 3):
+        raise ValueError('Expected 2 or 3 dimensions (got {})'.format(dim))
 
-    if probs.shape[0] != y.shape[0]:
+    if probs.shape[-2] != y.shape[0]:
         raise ValueError('Expected batch_size ({}) to match batch_size ({}).'
-                         .format(probs.shape[0], y.shape[0]))
+                         .format(probs.shape[-2], y.shape[0]))
+
+    return score_chunks(functools.partial(_logarithmic_scores, clip=clip),
+                        chunksize, probs, y, per_sample=per_sample)
 
-    # obtain dimensions
-    N = probs.shape[0]
 
-    return -np.mean(np.log(probs[np.arange(N), y]))
+def _logarithmic_scores(probs, y, clip=None):
+    """Evaluate the logarithmic score of every data point."""
+    probs_y = target_probs(probs, y)
+    if clip is not None:
+        probs_y = np.maximum(probs_y, clip)
+
+    return -np.log(probs_y)
 
 
 class LogarithmicScore:
 
+    def __init__(self, chunksize=None, per_sample=False, clip=None):
+        self.chunksize = chunksize
+        self.per_sample = per_sample
+        self.clip = clip
+
     def __call__(self, probs, y):
-        return logarithmic_score(probs, y)
+        return logarithmic_score(probs, y, chunksize=self.chunksize,
+                                 per_sample=self.per_sample, clip=self.clip)
 
     def __repr__(self):
-        return "LogarithmicScore"
+        return "LogarithmicScore(chunksize=%r, per_sample=%r, clip=%r)" % (
+            self.chunksize, self.per_sample, self.clip)
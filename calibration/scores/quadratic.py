@@ -1,35 +1,55 @@
-import numpy as np
+from calibration.utils.chunks import score_chunks
+from calibration.sparse import target_probs, squared_norm
 
 
-def quadratic_score(probs, y):
+def quadratic_score(probs, y, chunksize=None, per_sample=False):
     """
-    Evaluate the logarithmic score of the probabilities `probs` with
+    Evaluate the quadratic score of the probabilities `probs` with
     corresponding targets `y`.
 
     Probabilities `probs` should be of shape `(N, C)`, where `N` is the batch
-    size and `C` is the number of targets. Targets `y` should be of shape
-    `(N,)`.
+    size and `C` is the number of targets, or sparse probabilities of type
+    `TopKProbs`. Targets `y` should be of shape `(N,)`.
+
+    Probabilities `probs` can also be of shape `(M, N, C)`, such as the
+    predictions of `M` models for the same data points, in which case an
+    array with the `M` scores is returned.
+
+    If `per_sample` is `True`, the scores of the individual data points are
+    returned instead of their mean.
+
+    If `chunksize` is not `None`, the data is processed in chunks of at most
+    `chunksize` data points, and hence only intermediate arrays of this size
+    are allocated. This allows to use memory-mapped arrays as inputs.
     """
     # check dimensions
     dim = probs.ndim
-    if dim != 2:
-        raise ValueError('Expected 2 dimensions (got {})'.format(dim))
+    if dim not in (2, 3):
+        raise ValueError('Expected 2 or 3 dimensions (got {})'.format(dim))
 
-    if probs.shape[0] != y.shape[0]:
+    if probs.shape[-2] != y.shape[0]:
         raise ValueError('Expected batch_size ({}) to match batch_size ({}).'
-                         .format(probs.shape[0], y.shape[0]))
+                         .format(probs.shape[-2], y.shape[0]))
 
-    # obtain dimensions
-    N = probs.shape[0]
+    return score_chunks(_quadratic_scores, chunksize, probs, y,
+                        per_sample=per_sample)
 
-    return np.mean(np.einsum('ai,ai->a', probs, probs) -
-                   2 * probs[np.arange(N), y])
+
+def _quadratic_scores(probs, y):
+    """Evaluate the quadratic score of every data point."""
+    return squared_norm(probs) - 2 * target_probs(probs, y)
 
 
 class QuadraticScore:
 
+    def __init__(self, chunksize=None, per_sample=False):
+        self.chunksize = chunksize
+        self.per_sample = per_sample
+
     def __call__(self, probs, y):
-        return quadratic_score(probs, y)
+        return quadratic_score(probs, y, chunksize=self.chunksize,
+                               per_sample=self.per_sample)
 
     def __repr__(self):
-        return "QuadraticScore"
+        return "QuadraticScore(chunksize=%r, per_sample=%r)" % (
+            self.chunksize, self.per_sample)
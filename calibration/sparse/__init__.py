@@ -0,0 +1,8 @@
+from .topk import topk_probs, target_probs, squared_norm, TopKProbs
+
+__all__ = [
+    "topk_probs",
+    "target_probs",
+    "squared_norm",
+    "TopKProbs"
+]
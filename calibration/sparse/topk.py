@@ -0,0 +1,151 @@
+import numpy as np
+
+
+def topk_probs(probs, k):
+    """
+    Extract the `k` most confident predictions from probabilities `probs`.
+
+    Probabilities `probs` should be an array of shape `(N, C)`, where `N` is
+    the number of data points and `C` is the number of targets. The
+    predictions are returned as `TopKProbs`.
+    """
+    # check dimensions of predictions
+    dim = probs.ndim
+    if dim != 2:
+        raise ValueError('Expected 2 dimensions (got {})'.format(dim))
+
+    indices = np.argpartition(probs, -k, axis=1)[:, -k:]
+
+    return TopKProbs(indices, np.take_along_axis(probs, indices, axis=1),
+                     probs.shape[1])
+
+
+def target_probs(probs, y):
+    """
+    Return probabilities of targets `y` for dense or sparse probabilities
+    `probs`.
+
+    Probabilities `probs` should be an array of shape `(..., N, C)` or
+    `TopKProbs`, and targets `y` an array of shape `(N,)`.
+    """
+    if isinstance(probs, TopKProbs):
+        return probs.target_probs(y)
+
+    indices = np.reshape(y, (1,) * (probs.ndim - 2) + (-1, 1))
+    return np.take_along_axis(probs, indices, axis=-1)[..., 0]
+
+
+def squared_norm(probs):
+    """
+    Return squared Euclidean norm of dense or sparse probabilities `probs`.
+
+    Probabilities `probs` should be an array of shape `(..., N, C)` or
+    `TopKProbs`.
+    """
+    if isinstance(probs, TopKProbs):
+        return probs.squared_norm()
+
+    return np.einsum('...i,...i->...', probs, probs)
+
+
+class TopKProbs:
+    """
+    Sparse representation of probabilities of `nclasses` targets by the
+    probabilities `values` of the targets `indices`.
+
+    Targets `indices` and probabilities `values` should be arrays of shape
+    `(N, k)`, where `N` is the number of data points and `k` is the number of
+    stored targets of each data point, usually the `k` most confident
+    predictions. The remaining probability mass `residual` is assumed to be
+    distributed uniformly among the other `nclasses - k` targets.
+
+    The stored targets of each data point are sorted by decreasing
+    probability.
+    """
+
+    def __init__(self, indices, values, nclasses):
+        indices = np.asarray(indices)
+        values = np.asarray(values)
+
+        # check dimensions
+        if indices.ndim != 2:
+            raise ValueError(
+                'Expected 2 dimensions (got {})'.format(indices.ndim))
+
+        if indices.shape != values.shape:
+            raise ValueError('Expected shape of targets {} to match shape of '
+                             'probabilities {}.'.format(indices.shape,
+                                                        values.shape))
+
+        if indices.shape[1] > nclasses:
+            raise ValueError(
+                'Expected at most {} targets (got {})'.format(
+                    nclasses, indices.shape[1]))
+
+        # sort targets by decreasing probability
+        order = np.argsort(-values, axis=1, kind="stable")
+        self.indices = np.take_along_axis(indices, order, axis=1)
+        self.values = np.take_along_axis(values, order, axis=1)
+        self.nclasses = nclasses
+
+    @property
+    def shape(self):
+        """Return shape `(N, C)` of the dense probabilities."""
+        return (self.indices.shape[0], self.nclasses)
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def k(self):
+        """Return number of stored targets of each data point."""
+        return self.indices.shape[1]
+
+    @property
+    def residual(self):
+        """Return probability mass of the targets that are not stored."""
+        return np.maximum(1 - np.sum(self.values, axis=1), 0)
+
+    @property
+    def residual_value(self):
+        """Return probability of each target that is not stored."""
+        nothers = self.nclasses - self.k
+        if nothers == 0:
+            return np.zeros(self.indices.shape[0], dtype=self.values.dtype)
+
+        return self.residual / nothers
+
+    def target_probs(self, y):
+        """
+        Return probabilities of targets `y`.
+
+        Targets `y` should be an array of shape `(N,)` with entries in
+        `(0, ..., C-1)`.
+        """
+        stored = self.indices == y[:, np.newaxis]
+        return np.where(np.any(stored, axis=1),
+                        np.sum(self.values * stored, axis=1),
+                        self.residual_value)
+
+    def squared_norm(self):
+        """Return squared Euclidean norm of the probabilities."""
+        return (np.einsum('ai,ai->a', self.values, self.values) +
+                (self.nclasses - self.k) * self.residual_value ** 2)
+
+    def toarray(self):
+        """Return dense probabilities of shape `(N, C)`."""
+        out = np.repeat(self.residual_value[:, np.newaxis], self.nclasses,
+                        axis=1)
+        np.put_along_axis(out, self.indices, self.values, axis=1)
+        return out
+
+    def __getitem__(self, key):
+        return TopKProbs(self.indices[key], self.values[key], self.nclasses)
+
+    def __len__(self):
+        return self.indices.shape[0]
+
+    def __repr__(self):
+        return "TopKProbs(N=%r, k=%r, nclasses=%r)" % (
+            self.indices.shape[0], self.k, self.nclasses)
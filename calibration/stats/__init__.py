@@ -1,13 +1,25 @@
-from .ece import ece, ece_binned, ECE
+from .ece import ece, ece_binned, ece_sums, binned_sums, ECE
 from .bootstrap_ece import bootstrap_ece, BootstrapECE
 from .consistency_ece import consistency_ece, ConsistencyECE
+from .streaming_ece import StreamingECE
+from .lensed_ece import lensed_ece, LensedECE
+from .report import calibration_report, CalibrationReport
+from calibration.utils.instrument import instrument
 
 __all__ = [
     "ece",
     "ECE",
     "ece_binned",
+    "ece_sums",
+    "binned_sums",
     "bootstrap_ece",
     "BootstrapECE",
     "consistency_ece",
-    "ConsistencyECE"
+    "ConsistencyECE",
+    "StreamingECE",
+    "lensed_ece",
+    "LensedECE",
+    "calibration_report",
+    "CalibrationReport",
+    "instrument"
 ]
@@ -1,13 +1,21 @@
+import functools
+
 import numpy as np
 
-from calibration.sample import ResampleStats
-from ..stats import ECE
+from calibration.sample import ResampleStats, map_replicates, \
+    resample_counts
+from calibration.binning import BinningTree, UniformBinning
+from ..stats import ECE, ece_sums, binned_sums
+from .ece import _check_targets
+from .lensed_ece import _apply_lens
 
-from calibration.utils import distances
+from calibration.utils import distances, instrument
+from calibration.utils.rng import check_rng
 
 
 def bootstrap_ece(probs, y, n=1000, distance=distances.tvdistance,
-                  binning=None):
+                  binning=None, max_elements=2**24, n_jobs=None, rng=None,
+                  lens=None):
     """
     Evaluate the estimator of the ECE (expected calibration error) and
     estimate the standard deviation of its sampling distribution with `n`
@@ -16,36 +24,147 @@ def bootstrap_ece(probs, y, n=1000, distance=distances.tvdistance,
     `distance`.
 
     Probabilities `probs` should be an array of shape `(N, C)`, where `N` is
-    the batch size and `C` is the number of targets. Targets `y` should be a
-    an array of shape `(N, C)` with one-hot encoded rows.
+    the batch size and `C` is the number of targets. Targets `y` should be an
+    array of shape `(N, C)` with one-hot encoded rows or an array of shape
+    `(N,)` with integer labels in `(0, ..., C-1)`, which are counted in each
+    bin without creating one-hot encoded targets.
 
     If `binning` is `None` (the default), the default binning scheme of
     function `ece` is used.
+
+    If the bins of binning scheme `binning` do not depend on the data (such
+    as for `UniformBinning`), the binning tree is fit only once and the
+    bootstrap samples are evaluated in chunks from the number of times each
+    data point is drawn. Every chunk contains as many bootstrap samples as
+    fit into `max_elements` (by default `2**24`) resampled data points, but
+    at least one bootstrap sample.
+
+    If `n_jobs` or `rng` is not `None`, every bootstrap sample is generated
+    with its own random number generator spawned from random number
+    generator `rng`, and the bootstrap samples are evaluated in a pool of
+    `n_jobs` processes (see `resample_stats`).
+
+    If calibration lens `lens` is not `None`, the ECE of the probabilities
+    and targets extracted by `lens(probs, y)` is evaluated. The lens is
+    applied only once, before the data is resampled.
     """
-    # define ECE statistic
-    ece = ECE(distance, binning)
+    if binning is None:
+        binning = UniformBinning(bins=10)
+
+    probs, y = _apply_lens(lens, probs, y)
+    _check_targets(probs, y)
+
+    # resample the complete data set if bins depend on the data
+    if getattr(binning, "data_dependent", True):
+        # define ECE statistic
+        ece = ECE(distance, binning)
+
+        # evaluate ECE of original data set
+        with instrument.stage("original"):
+            orig_ece = ece(probs, y)
+
+        # compute estimate of the standard deviation of ECE by bootstrapping
+        resample = ResampleStats(ece, n, n_jobs=n_jobs, rng=rng)
+        with instrument.stage("replicates"):
+            bootstrap_ece_std = np.std(resample(probs, y))
+
+        return orig_ece, bootstrap_ece_std
 
     # evaluate ECE of original data set
-    orig_ece = ece(probs, y)
+    with instrument.stage("original"):
+        binning_tree = BinningTree(binning).fit(probs)
+        orig_ece = ece_sums(*binned_sums(binning_tree.binnumbers,
+                                         binning_tree.nbins,
+                                         binning_tree.probs, y),
+                            distance)
 
     # compute estimate of the standard deviation of ECE by bootstrapping
-    resample = ResampleStats(ece, n)
-    bootstrap_ece_std = np.std(resample(probs, y))
+    bootstrap = functools.partial(_bootstrap_ece_fixed, distance,
+                                  max_elements)
+    data = (binning_tree.indices, binning_tree.offsets[:-1],
+            binning_tree.probs, y)
+    with instrument.stage("replicates"):
+        if n_jobs is None and rng is None:
+            samples = bootstrap([None] * n, *data)
+        else:
+            samples = map_replicates(bootstrap, *data, n=n, n_jobs=n_jobs,
+                                     rng=rng)
+    bootstrap_ece_std = np.std(samples)
 
     return orig_ece, bootstrap_ece_std
 
 
+def _bootstrap_ece_fixed(distance, max_elements, rngs, indices, starts,
+                         probs, y):
+    """
+    Evaluate ECE of bootstrap samples for a binning tree whose bins do not
+    depend on the data, given by the permutation `indices` of the data and
+    the `starts` of the bins.
+
+    One bootstrap sample is evaluated for every random number generator in
+    `rngs`. If a generator is `None`, the global random state is used.
+    """
+    n = len(rngs)
+    N, C = probs.shape
+    nbins = starts.size
+
+    # number of bootstrap samples per chunk
+    nchunk = max(1, max_elements // max(N, 1))
+
+    # labels are counted with keys of bins and labels of the data points
+    if y.ndim == 1:
+        binnumbers = np.repeat(np.arange(nbins),
+                               np.diff(np.append(starts, N)))
+        keys = binnumbers * C + y[indices]
+
+    samples = []
+    for start in range(0, n, nchunk):
+        m = min(nchunk, n - start)
+
+        # count how often each data point is drawn, with the data points of
+        # every bin arranged consecutively
+        weights = resample_counts(rngs[start:start + m], N)[:, indices]
+
+        # sum weighted data in each bin
+        counts = np.add.reduceat(weights, starts, axis=1)
+        probs_sums = np.stack(
+            [np.add.reduceat(weights * probs[indices, i], starts, axis=1)
+             for i in range(C)], axis=-1)
+        if y.ndim == 1:
+            sample_keys = keys + nbins * C * np.arange(m)[:, np.newaxis]
+            y_sums = np.bincount(sample_keys.ravel(), weights=weights.ravel(),
+                                 minlength=m * nbins * C).reshape(m, nbins, C)
+        else:
+            y_sums = np.stack(
+                [np.add.reduceat(weights * y[indices, i], starts, axis=1)
+                 for i in range(C)], axis=-1)
+
+        samples.append(ece_sums(counts, probs_sums, y_sums, distance))
+
+    return list(np.concatenate(samples))
+
+
 class BootstrapECE:
 
-    def __init__(self, n=1000, distance=distances.tvdistance, binning=None):
+    def __init__(self, n=1000, distance=distances.tvdistance, binning=None,
+                 max_elements=2**24, n_jobs=None, rng=None, lens=None):
         self.n = n
         self.distance = distance
         self.binning = binning
+        self.max_elements = max_elements
+        self.n_jobs = n_jobs
+        self.rng = check_rng(rng)
+        self.lens = lens
 
     def __call__(self, probs, y):
         return bootstrap_ece(probs, y, n=self.n, distance=self.distance,
-                             binning=self.binning)
+                             binning=self.binning,
+                             max_elements=self.max_elements,
+                             n_jobs=self.n_jobs, rng=self.rng,
+                             lens=self.lens)
 
     def __repr__(self):
-        return "BootstrapECE(n=%r, distance=%r, binning=%r)" % (
-            self.n, self.distance, self.binning)
+        return ("BootstrapECE(n=%r, distance=%r, binning=%r, "
+                "max_elements=%r, n_jobs=%r, rng=%r, lens=%r)" % (
+                    self.n, self.distance, self.binning, self.max_elements,
+                    self.n_jobs, self.rng, self.lens))
@@ -1,13 +1,20 @@
+import functools
+
 import numpy as np
 
-from calibration.sample import ResampleStats
-from ..stats import ece
+from calibration.sample import map_replicates
+from calibration.utils.rng import check_rng, randint, \
+    uniform as random_uniform
+from calibration.binning import BinningTree, UniformBinning
+from ..stats import ece, ece_sums
+from .lensed_ece import _apply_lens
 
-from calibration.utils import distances
+from calibration.utils import distances, instrument
 
 
 def consistency_ece(probs, n=1000, distance=distances.tvdistance,
-                    binning=None):
+                    binning=None, max_elements=2**24, n_jobs=None,
+                    rng=None, lens=None):
     """
     Estimate the mean and standard deviation of the estimator of the ECE
     (expected calibration error) with respect to the binning scheme `binning`
@@ -20,12 +27,44 @@ def consistency_ece(probs, n=1000, distance=distances.tvdistance,
 
     If `binning` is `None` (the default), the default binning scheme of
     function `ece` is used.
+
+    If the bins of binning scheme `binning` do not depend on the data (such
+    as for `UniformBinning`), the binning tree is fit only once and the
+    consistency resampling is performed in chunks. Every chunk contains as
+    many resampled data sets as fit into `max_elements` (by default `2**24`)
+    data points, but at least one data set.
+
+    If `n_jobs` or `rng` is not `None`, every data set is resampled with its
+    own random number generator spawned from random number generator `rng`,
+    and the data sets are evaluated in a pool of `n_jobs` processes (see
+    `resample_stats`).
+
+    If calibration lens `lens` is not `None`, the ECE of the probabilities
+    extracted by `lens` is evaluated, and consistent targets are sampled from
+    them. The lens is applied only once, before the data is resampled, with
+    targets of value zero whose values are discarded.
     """
-    # define ece resampling
-    resample = ResampleStats(lambda x: ece(x, None, distance, binning), n)
+    if binning is None:
+        binning = UniformBinning(bins=10)
+
+    probs = _apply_lens(lens, probs)
 
     # generate samples with consistency resampling
-    consistency_ece_samples = resample(probs)
+    if getattr(binning, "data_dependent", True):
+        consistency = functools.partial(_consistency_ece, distance, binning)
+        data = (probs,)
+    else:
+        binning_tree = BinningTree(binning).fit(probs)
+        consistency = functools.partial(_consistency_ece_fixed, distance,
+                                        max_elements)
+        data = (binning_tree.binnumbers, binning_tree.probs)
+
+    with instrument.stage("replicates"):
+        if n_jobs is None and rng is None:
+            consistency_ece_samples = consistency([None] * n, *data)
+        else:
+            consistency_ece_samples = map_replicates(
+                consistency, *data, n=n, n_jobs=n_jobs, rng=rng)
 
     # compute mean and standard deviation of the empirical distribution
     consistency_ece_mean = np.mean(consistency_ece_samples)
@@ -34,17 +73,99 @@ def consistency_ece(probs, n=1000, distance=distances.tvdistance,
     return consistency_ece_mean, consistency_ece_std
 
 
+def _consistency_ece(distance, binning, rngs, probs):
+    """
+    Evaluate ECE of consistency resampled data sets.
+
+    One data set is evaluated for every random number generator in `rngs`.
+    If a generator is `None`, the global random state is used.
+    """
+    N = probs.shape[0]
+
+    samples = []
+    for rng in rngs:
+        indices = randint(rng, N, size=(N,))
+        samples.append(ece(probs[indices], None, distance=distance,
+                           binning=binning, rng=rng))
+
+    return samples
+
+
+def _consistency_ece_fixed(distance, max_elements, rngs, binnumbers,
+                           probs):
+    """
+    Evaluate ECE of consistency resampled data sets for a binning tree whose
+    bins do not depend on the data, given by the bin numbers `binnumbers` of
+    the data.
+
+    One data set is evaluated for every random number generator in `rngs`.
+    If a generator is `None`, the global random state is used.
+    """
+    n = len(rngs)
+    nbins = np.max(binnumbers) + 1
+    N, C = probs.shape
+    cumprobs = np.cumsum(probs, axis=1)
+
+    # number of data sets per chunk
+    nchunk = max(1, max_elements // max(N, 1))
+
+    samples = []
+    for start in range(0, n, nchunk):
+        m = min(nchunk, n - start)
+
+        # resample data points and draw random numbers for their targets
+        # in the same order as `ResampleStats` and `consistent_targets`
+        indices = np.empty((m, N), dtype=np.int64)
+        uniform = np.empty((m, N))
+        for i, rng in enumerate(rngs[start:start + m]):
+            indices[i] = randint(rng, N, size=(N,))
+            uniform[i] = random_uniform(rng, size=N)
+
+        # sample consistent targets of all data sets
+        if C == 2:
+            targets = (uniform < probs[indices, 1]).astype(np.int64)
+        else:
+            targets = np.zeros((m, N), dtype=np.int64)
+            for i in range(C - 1):
+                targets += uniform >= cumprobs[indices, i]
+
+        # count samples and targets and sum probabilities in each bin
+        keys = binnumbers[indices] + nbins * np.arange(m)[:, np.newaxis]
+        counts = np.bincount(keys.ravel(), minlength=m * nbins).reshape(
+            m, nbins)
+        probs_sums = np.stack(
+            [np.bincount(keys.ravel(), weights=probs[indices, i].ravel(),
+                         minlength=m * nbins)
+             for i in range(C)], axis=-1).reshape(m, nbins, C)
+        y_sums = np.bincount((keys * C + targets).ravel(),
+                             minlength=m * nbins * C).reshape(m, nbins, C)
+
+        samples.append(ece_sums(counts, probs_sums, y_sums, distance))
+
+    return list(np.concatenate(samples))
+
+
 class ConsistencyECE:
 
-    def __init__(self, n=1000, distance=distances.tvdistance, binning=None):
+    def __init__(self, n=1000, distance=distances.tvdistance, binning=None,
+                 max_elements=2**24, n_jobs=None, rng=None, lens=None):
         self.n = n
         self.distance = distance
         self.binning = binning
+        self.max_elements = max_elements
+        self.n_jobs = n_jobs
+        self.rng = check_rng(rng)
+        self.lens = lens
 
     def __call__(self, probs):
         return consistency_ece(probs, n=self.n, distance=self.distance,
-                               binning=self.binning)
+                               binning=self.binning,
+                               max_elements=self.max_elements,
+                               n_jobs=self.n_jobs, rng=self.rng,
+                               lens=self.lens)
 
     def __repr__(self):
-        return "ConsistencyECE(n=%r, distance=%r, binning=%r)" % (
-            self.n, self.distance, self.binning)
+        return ("ConsistencyECE(n=%r, distance=%r, binning=%r, "
+                "max_elements=%r, n_jobs=%r, rng=%r, lens=%r)" % (
+                    self.n, self.distance, self.binning, self.max_elements,
+                    self.n_jobs, self.rng, self.lens))
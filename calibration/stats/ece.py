@@ -1,11 +1,14 @@
 import numpy as np
 
-from calibration.utils import distances
+from calibration.utils import distances, instrument
+from calibration.utils.chunks import chunk_slices
+from calibration.utils.rng import check_rng
 from calibration.sample import consistent_targets
 from calibration.binning import BinningTree, UniformBinning
 
 
-def ece(probs, y, distance=distances.tvdistance, binning=None):
+def ece(probs, y, distance=distances.tvdistance, binning=None,
+        chunksize=None, rng=None, cache=None):
     """
     Estimate ECE (expected calibration error) of probabilities `probs`
     with corresponding targets `y` with respect to binning scheme `binning`
@@ -17,24 +20,259 @@ def ece(probs, y, distance=distances.tvdistance, binning=None):
     where `N` is the number of data points and `C` is the number of targets.
     If `probs` is a vector of shape `(N,)`, its entries are interpreted as
     the probabilities of the first target in a binary classification problem.
-    Targets `y` should be `None` or an array of shape `(N, C)` with one-hot
-    encoded rows. If `y` is `None`, consistent targets are sampled from
-    probabilities `probs`.
+    Targets `y` should be `None`, an array of shape `(N, C)` with one-hot
+    encoded rows, or an array of shape `(N,)` of integer labels with entries
+    in `(0, ..., C-1)`. Labels are counted in each bin without creating
+    one-hot encoded targets. If `y` is `None`, consistent targets are sampled
+    from probabilities `probs` with random number generator `rng` (see
+    `consistent_targets`).
 
     If `binning` is `None` (the default), a binning scheme with 10 bins of
-    uniform size along each dimension is used.
+    uniform size along each dimension is used. Distance measure `distance`
+    is evaluated once for the averages of all bins (see `ece_sums`).
+
+    If `chunksize` is not `None`, the data is processed in chunks of at most
+    `chunksize` data points, and hence only intermediate arrays of this size
+    are allocated. This allows to use memory-mapped arrays as inputs, but
+    requires a binning scheme whose bins do not depend on the data.
+
+    If `cache` is not `None`, the binning tree is obtained from cache
+    `cache` of type `BinningCache`, which reuses the tree and the bin numbers
+    of previous calls with the same probabilities and binning scheme, e.g.,
+    for different targets or distance measures. The cache is not used if the
+    data is processed in chunks.
+
+    Probabilities of lower precision, such as `np.float32`, are binned
+    without conversion, whereas the sums of probabilities and targets in
+    each bin are accumulated in double precision. Hence the estimate equals
+    the estimate for the probabilities converted to `np.float64` up to
+    rounding errors of order `1e-16`. Compared with the estimate for
+    probabilities of double precision that are rounded to single precision,
+    the estimate changes by at most `2**-25` for the total variation
+    distance (`2**-24` for the L1 distance) unless rounding moves
+    probabilities to another bin.
     """
     if binning is None:
         binning = UniformBinning(bins=10)
 
-    binning_tree = BinningTree(binning).fit(probs)
-    binned_probs = binning_tree.bin_data()
-    binned_y = None if y is None else binning_tree.bin_data(y)
+    if y is not None:
+        _check_targets(probs, y)
+
+    with instrument.stage("ece"):
+        # process data in chunks
+        if chunksize is not None and probs.shape[0] > chunksize:
+            if getattr(binning, "data_dependent", True):
+                raise ValueError(
+                    "Expected binning scheme whose bins do not depend on the "
+                    "data (got {!r})".format(binning))
+
+            rng = check_rng(rng)
+            with instrument.stage("region_sums"):
+                _, counts, probs_sums, y_sums = _accumulate_region_sums(
+                    binning, ((probs[s], None if y is None else y[s])
+                              for s in chunk_slices(probs.shape[0],
+                                                    chunksize)),
+                    rng=rng)
+        else:
+            if cache is None:
+                binning_tree = BinningTree(binning).fit(probs)
+            else:
+                binning_tree = cache.fit(binning, probs)
+            probs = binning_tree.probs
+
+            # create consistent targets
+            if y is None:
+                with instrument.stage("consistent_targets"):
+                    y = consistent_targets(probs, rng=rng)
+
+            with instrument.stage("binned_sums"):
+                counts, probs_sums, y_sums = binned_sums(
+                    binning_tree.binnumbers, binning_tree.nbins, probs, y)
+
+        instrument.metric("nbins", int(np.count_nonzero(counts)))
+        with instrument.stage("ece_sums"):
+            return ece_sums(counts, probs_sums, y_sums, distance)
+
+
+def _check_targets(probs, y):
+    """Check dimensions of targets `y` of probabilities `probs` and the
+    range of labels."""
+    N = probs.shape[0]
+    C = probs.shape[1] if probs.ndim > 1 else 2
+
+    if y.shape[0] != N:
+        raise ValueError('Expected batch_size ({}) to match batch_size ({}).'
+                         .format(y.shape[0], N))
+
+    if y.ndim == 2:
+        if y.shape[1] != C:
+            raise ValueError(
+                'Expected number of targets ({}) to match number of targets '
+                '({}).'.format(y.shape[1], C))
+    elif y.ndim == 1:
+        if not np.issubdtype(y.dtype, np.integer):
+            raise ValueError('Expected integer labels (got {})'
+                             .format(y.dtype))
+        if N > 0 and (np.min(y) < 0 or np.max(y) >= C):
+            raise ValueError('Expected labels in (0, ..., {}) (got {} to {})'
+                             .format(C - 1, np.min(y), np.max(y)))
+    else:
+        raise ValueError('Expected 1 or 2 dimensions (got {})'.format(y.ndim))
+
+
+def binned_sums(binnumbers, nbins, probs, y):
+    """
+    Compute the number of samples and the sums of probabilities `probs` and
+    targets `y` in each bin.
+
+    Bin numbers `binnumbers` should be an array of shape `(N,)` with entries
+    in `(0, ..., nbins-1)`, where `N` is the number of data points.
+    Probabilities `probs` should be an array of shape `(N, C)`, where `C` is
+    the number of targets. Targets `y` should be an array of shape `(N, C)`
+    with one-hot encoded rows or an array of shape `(N,)` with entries in
+    `(0, ..., C-1)`.
+
+    The counts are returned as an array of shape `(nbins,)`, and the sums as
+    arrays of shape `(nbins, C)`. The sums are accumulated in double
+    precision, regardless of the precision of `probs` and `y`.
+    """
+    nclasses = probs.shape[-1]
+    counts = np.bincount(binnumbers, minlength=nbins)
+    probs_sums = _column_sums(binnumbers, nbins, probs)
+
+    if y.ndim == 1:
+        y_sums = np.bincount(binnumbers * nclasses + y,
+                             minlength=nbins * nclasses).reshape(
+                                 nbins, nclasses)
+    else:
+        y_sums = _column_sums(binnumbers, nbins, y)
+
+    return counts, probs_sums, y_sums
+
+
+def _region_sums(binning, probs, y, rng=None):
+    """
+    Compute the number of samples and the sums of probabilities `probs` and
+    targets `y` in the regions of the non-empty bins of binning scheme
+    `binning`, whose bins do not depend on the data.
+    """
+    # expand one-dimensional probability vectors
+    if probs.ndim == 1:
+        probs = np.stack([probs, 1-probs], axis=-1)
+
+    # create consistent targets
+    if y is None:
+        y = consistent_targets(probs, rng=rng)
+
+    regions, binnumbers = _unique_regions(_region_keys(binning, probs))
+
+    return (regions,) + binned_sums(binnumbers, regions.shape[0], probs, y)
+
+
+def _accumulate_region_sums(binning, batches, rng=None):
+    """
+    Compute the number of samples and the sums of probabilities and targets
+    in the regions of the non-empty bins of binning scheme `binning` for all
+    batches of probabilities and targets in iterable `batches`.
+
+    The statistics of every batch are combined with the statistics of the
+    previous batches right away, so that only one batch and the statistics
+    of the non-empty bins are kept in memory.
+    """
+    totals = None
+    for probs, y in batches:
+        stats = _region_sums(binning, probs, y, rng=rng)
+        if totals is not None:
+            stats = _combine_region_sums(
+                *(np.concatenate(x) for x in zip(totals, stats)))
+        totals = stats
 
-    return ece_binned(binned_probs, binned_y, distance)
+    return totals
 
 
-def ece_binned(binned_probs, binned_y, distance=distances.tvdistance):
+def _region_keys(binning, probs):
+    """
+    Return keys of the regions of probabilities `probs` in binning scheme
+    `binning` as an array of shape `(N, K)`.
+
+    The indices of the bins along each axis are packed into as few integer
+    keys as possible if the binning scheme supports it (such as
+    `UniformBinning`), since finding unique rows of many columns is slow.
+    """
+    digits = binning.digitize(probs)
+    pack = getattr(binning, "_pack", None)
+    if pack is None:
+        return digits
+
+    keys = pack(digits) or [np.zeros(digits.shape[0], dtype=np.int64)]
+    return np.stack(keys, axis=-1)
+
+
+def _unique_regions(regions):
+    """Return unique rows of keys `regions` and the indices of the rows of
+    `regions` in them."""
+    if regions.shape[1] == 1:
+        unique, inverse = np.unique(regions[:, 0], return_inverse=True)
+        return unique[:, np.newaxis], inverse.reshape(-1)
+
+    unique, inverse = np.unique(regions, axis=0, return_inverse=True)
+    return unique, inverse.reshape(-1)
+
+
+def _combine_region_sums(regions, counts, probs_sums, y_sums):
+    """Combine the number of samples and the sums of probabilities and
+    targets of the same regions."""
+    regions, binnumbers = _unique_regions(regions)
+    nbins = regions.shape[0]
+
+    counts = np.bincount(binnumbers, weights=counts,
+                         minlength=nbins).astype(np.int64)
+    probs_sums = _column_sums(binnumbers, nbins, probs_sums)
+    y_sums = _column_sums(binnumbers, nbins, y_sums)
+
+    return regions, counts, probs_sums, y_sums
+
+
+def _column_sums(binnumbers, nbins, data):
+    """Sum columns of `data` in each bin."""
+    return np.stack([np.bincount(binnumbers, weights=data[:, i],
+                                 minlength=nbins)
+                     for i in range(data.shape[-1])], axis=-1)
+
+
+def ece_sums(counts, probs_sums, y_sums, distance=distances.tvdistance):
+    """
+    Estimate ECE (expected calibration error) from the number of samples
+    `counts` and the sums of probabilities `probs_sums` and targets `y_sums`
+    in each bin with respect to distance measure `distance`.
+
+    Counts `counts` should be an array of shape `(..., B)`, where `B` is the
+    number of bins, and sums `probs_sums` and `y_sums` arrays of shape
+    `(..., B, C)`, where `C` is the number of targets. Bins without samples
+    are ignored. The distance of the averages of all bins is evaluated in one
+    call of `distance`, which should therefore compute distances along the
+    last axis of arrays of shape `(..., B, C)` and return an array of shape
+    `(..., B)`, such as the functions in `calibration.utils.distances`.
+    Distance measures of single vectors that return a scalar are evaluated
+    for every bin separately.
+    """
+    counts = np.asarray(counts)
+    nonempty = counts > 0
+
+    # compute averages in each bin
+    _counts = np.where(nonempty, counts, 1)[..., np.newaxis]
+    distance_bins = _bin_distances(distance, probs_sums / _counts,
+                                   y_sums / _counts)
+
+    # sum distances of average predictions to outcomes in each bin,
+    # weighted by the proportion of predictions
+    proportions = counts / np.sum(counts, axis=-1, keepdims=True)
+    return np.sum(np.where(nonempty, proportions * distance_bins, 0),
+                  axis=-1)
+
+
+def ece_binned(binned_probs, binned_y, distance=distances.tvdistance,
+               rng=None):
     """
     Estimate ECE (expected calibration error) of binned probabilities
     `binned_probs` with corresponding targets `binned_y` with respect to
@@ -45,14 +283,18 @@ def ece_binned(binned_probs, binned_y, distance=distances.tvdistance):
     of the list `binned_probs` should correspond to a set of probabilties in a
     different region of the probability simplex. Targets `binned_y` should be
     `None` or a corresponding list of the same length as `binned_probs` with
-    arrays of shape `(N, C)` with one-hot encoded rows. If `binned_y` is
-    `None`, consistent targets are sampled from probabilities `binned_probs`.
+    arrays of shape `(N, C)` with one-hot encoded rows or arrays of shape
+    `(N,)` with integer labels in `(0, ..., C-1)`. If `binned_y` is `None`,
+    consistent labels are sampled from probabilities `binned_probs` with
+    random number generator `rng` (see `consistent_targets`).
+
+    Distance measure `distance` is evaluated once for the averages of all
+    bins, as in `ece_sums`.
     """
     # create consistent targets
     if binned_y is None:
-        nclasses = binned_probs[0].shape[-1]
-        onehot = np.eye(nclasses)
-        binned_y = [onehot[consistent_targets(x)] for x in binned_probs]
+        rng = check_rng(rng)
+        binned_y = [consistent_targets(x, rng=rng) for x in binned_probs]
 
     # obtain proportion of different bins
     proportions = np.array([x.shape[0] for x in binned_y])
@@ -60,20 +302,53 @@ def ece_binned(binned_probs, binned_y, distance=distances.tvdistance):
 
     # sum distances of average predictions to outcomes in each bin,
     # weighted by the proportion of predictions
+    nclasses = binned_probs[0].shape[-1]
+    probs_means = np.stack([x.mean(axis=0, dtype=np.float64)
+                            for x in binned_probs])
+    y_means = np.stack([np.bincount(y, minlength=nclasses) / y.shape[0]
+                        if y.ndim == 1 else y.mean(axis=0, dtype=np.float64)
+                        for y in binned_y])
     return np.dot(proportions,
-                  np.array([distance(x.mean(axis=0),
-                                     y.mean(axis=0))
-                            for x, y in zip(binned_probs, binned_y)]))
+                  _bin_distances(distance, probs_means, y_means))
+
+
+def _bin_distances(distance, probs_means, y_means):
+    """
+    Evaluate distance measure `distance` of averages `probs_means` and
+    `y_means` of shape `(..., B, C)` in each bin.
+
+    Distance measures that return a scalar are evaluated for every bin
+    separately; all other results have to be of shape `(..., B)`.
+    """
+    distance_bins = np.asarray(distance(probs_means, y_means))
+    shape = probs_means.shape[:-1]
+    if distance_bins.shape == shape:
+        return distance_bins
+
+    if distance_bins.ndim == 0:
+        C = probs_means.shape[-1]
+        return np.array([distance(x, y) for x, y in
+                         zip(probs_means.reshape(-1, C),
+                             y_means.reshape(-1, C))]).reshape(shape)
+
+    raise ValueError(
+        'Expected distances of shape {} (got {}); the distance measure '
+        'should be evaluated along the last axis'.format(
+            shape, distance_bins.shape))
 
 
 class ECE:
 
-    def __init__(self, distance=distances.tvdistance, binning=None):
+    def __init__(self, distance=distances.tvdistance, binning=None,
+                 rng=None, cache=None):
         self.distance = distance
         self.binning = binning
+        self.rng = check_rng(rng)
+        self.cache = cache
 
     def __call__(self, probs, y):
-        return ece(probs, y, distance=self.distance, binning=self.binning)
+        return ece(probs, y, distance=self.distance, binning=self.binning,
+                   rng=self.rng, cache=self.cache)
 
     def __repr__(self):
         return "ECE(distance=%r)" % self.distance
@@ -0,0 +1,93 @@
+import numpy as np
+
+from calibration.utils import distances, instrument
+from calibration.utils.chunks import chunk_slices, map_chunks
+from calibration.binning import UniformBinning
+from ..stats import ece, ece_sums
+from .ece import _accumulate_region_sums
+
+
+def lensed_ece(probs, y, lens=None, distance=distances.tvdistance,
+               binning=None, chunksize=None):
+    """
+    Estimate ECE (expected calibration error) of the probabilities and
+    targets that calibration lens `lens` extracts from probabilities `probs`
+    and targets `y` with respect to binning scheme `binning` and distance
+    measure `distance`.
+
+    Calibration lens `lens` should be a function that is called as
+    `lens(probs, y)` and returns the new probabilities and targets, such as
+    `MaximumLens()`. If `lens` is `None` (the default), the ECE of `probs`
+    and `y` is estimated.
+
+    If `binning` is `None` (the default), a binning scheme with 10 bins of
+    uniform size along each dimension is used.
+
+    If `chunksize` is not `None`, the data is processed in chunks of at most
+    `chunksize` data points. If the bins of binning scheme `binning` do not
+    depend on the data, every chunk is passed through the lens, binned, and
+    reduced to the sums of probabilities and targets in each bin before the
+    next chunk is processed, and hence no array with all lensed
+    probabilities is allocated. Otherwise only the lens is applied in chunks.
+    """
+    if binning is None:
+        binning = UniformBinning(bins=10)
+
+    if lens is None:
+        return ece(probs, y, distance=distance, binning=binning,
+                   chunksize=chunksize)
+
+    # process data in chunks
+    if chunksize is not None and probs.shape[0] > chunksize:
+        if getattr(binning, "data_dependent", True):
+            with instrument.stage("lens"):
+                lensed_probs, lensed_y = map_chunks(lens, chunksize, probs,
+                                                    y)
+            return ece(lensed_probs, lensed_y, distance=distance,
+                       binning=binning)
+
+        with instrument.stage("region_sums"):
+            _, counts, probs_sums, y_sums = _accumulate_region_sums(
+                binning, (lens(probs[s], y[s])
+                          for s in chunk_slices(probs.shape[0], chunksize)))
+
+        return ece_sums(counts, probs_sums, y_sums, distance)
+
+    probs, y = _apply_lens(lens, probs, y)
+    return ece(probs, y, distance=distance, binning=binning)
+
+
+def _apply_lens(lens, probs, y=None):
+    """
+    Apply calibration lens `lens` to probabilities `probs` and targets `y`.
+
+    If `lens` is `None`, the probabilities and targets are returned
+    unchanged. If `y` is `None`, only the new probabilities are returned;
+    they are extracted with targets of value zero.
+    """
+    if lens is None:
+        return probs if y is None else (probs, y)
+
+    with instrument.stage("lens"):
+        if y is None:
+            return lens(probs, np.zeros(probs.shape[0], dtype=np.int64))[0]
+
+        return lens(probs, y)
+
+
+class LensedECE:
+
+    def __init__(self, lens=None, distance=distances.tvdistance,
+                 binning=None, chunksize=None):
+        self.lens = lens
+        self.distance = distance
+        self.binning = binning
+        self.chunksize = chunksize
+
+    def __call__(self, probs, y):
+        return lensed_ece(probs, y, lens=self.lens, distance=self.distance,
+                          binning=self.binning, chunksize=self.chunksize)
+
+    def __repr__(self):
+        return "LensedECE(lens=%r, distance=%r, binning=%r, chunksize=%r)" % (
+            self.lens, self.distance, self.binning, self.chunksize)
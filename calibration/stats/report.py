@@ -0,0 +1,114 @@
+import numpy as np
+
+from calibration.utils import distances as _distances
+from calibration.binning import BinningTree, UniformBinning
+from ..stats import binned_sums
+from .ece import _bin_distances, _check_targets
+
+
+def calibration_report(probs, y, lenses=None, binnings=None, distances=None,
+                       scores=None):
+    """
+    Estimate ECE (expected calibration error) of probabilities `probs` with
+    corresponding targets `y` for all combinations of calibration lenses
+    `lenses`, binning schemes `binnings` and distance measures `distances`,
+    and evaluate scoring rules `scores`.
+
+    Probabilities `probs` should be an array of shape `(N,)` or `(N, C)`,
+    where `N` is the number of data points and `C` is the number of targets.
+    Targets `y` should be an array of shape `(N, C)` with one-hot encoded rows
+    or an array of shape `(N,)` with entries in `(0, ..., C-1)`.
+
+    Lenses, binning schemes, distance measures and scoring rules can be given
+    as dictionaries that map their names to them, or as lists, in which case
+    they are named after the `__name__` or representation of their elements.
+    A lens `None` leaves the data unchanged. If `lenses` is `None` (the
+    default), only the unchanged data is evaluated (with name `"None"`); if
+    `binnings` is `None` (the default), a binning scheme with 10 bins of
+    uniform size along each dimension is used; and if `distances` is `None`
+    (the default), the total variation distance is used. Scoring rules are
+    evaluated for the unchanged data and require `C` targets.
+
+    Every lens is applied once, and the data it extracts is binned once for
+    every binning scheme. The ECE with respect to all distance measures is
+    computed from the same averages of the probabilities and targets in each
+    bin.
+
+    The estimates are returned as a dictionary with keys `"ece"` and
+    `"scores"`. The estimate of the ECE for lens `l`, binning scheme `b` and
+    distance measure `d` is given by `report["ece"][l][b][d]`, and the value
+    of scoring rule `s` by `report["scores"][s]`.
+    """
+    # check dimensions
+    if probs.ndim not in (1, 2):
+        raise ValueError(
+            'Expected 1 or 2 dimensions (got {})'.format(probs.ndim))
+
+    _check_targets(probs, y)
+
+    lenses = _named([None] if lenses is None else lenses)
+    binnings = _named([UniformBinning(bins=10)] if binnings is None
+                      else binnings)
+    distances = _named([_distances.tvdistance] if distances is None
+                       else distances)
+    scores = _named({} if scores is None else scores)
+
+    report = {"ece": {}, "scores": {}}
+    for lens_name, lens in lenses:
+        lensed_probs, lensed_y = (probs, y) if lens is None else \
+            lens(probs, y)
+
+        report_lens = report["ece"][lens_name] = {}
+        for binning_name, binning in binnings:
+            binning_tree = BinningTree(binning).fit(lensed_probs)
+            counts, probs_sums, y_sums = binned_sums(
+                binning_tree.binnumbers, binning_tree.nbins,
+                binning_tree.probs, lensed_y)
+
+            # all bins are non-empty
+            proportions = counts / np.sum(counts)
+            probs_means = probs_sums / counts[:, np.newaxis]
+            y_means = y_sums / counts[:, np.newaxis]
+
+            report_lens[binning_name] = {
+                distance_name: np.dot(proportions,
+                                      _bin_distances(distance, probs_means,
+                                                     y_means))
+                for distance_name, distance in distances}
+
+    # scoring rules are evaluated with labels
+    if scores:
+        labels = y if y.ndim == 1 else np.argmax(y, axis=1)
+        for score_name, score in scores:
+            report["scores"][score_name] = score(probs, labels)
+
+    return report
+
+
+def _named(spec):
+    """Return list of names and elements of dictionary or list `spec`."""
+    if isinstance(spec, dict):
+        return list(spec.items())
+
+    return [(getattr(x, "__name__", repr(x)), x) for x in spec]
+
+
+class CalibrationReport:
+
+    def __init__(self, lenses=None, binnings=None, distances=None,
+                 scores=None):
+        self.lenses = lenses
+        self.binnings = binnings
+        self.distances = distances
+        self.scores = scores
+
+    def __call__(self, probs, y):
+        return calibration_report(probs, y, lenses=self.lenses,
+                                  binnings=self.binnings,
+                                  distances=self.distances,
+                                  scores=self.scores)
+
+    def __repr__(self):
+        return ("CalibrationReport(lenses=%r, binnings=%r, distances=%r, "
+                "scores=%r)" % (self.lenses, self.binnings, self.distances,
+                                self.scores))
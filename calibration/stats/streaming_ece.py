@@ -0,0 +1,106 @@
+import numpy as np
+
+from calibration.binning import UniformBinning
+from ..stats import ece_sums
+from .ece import _check_targets, _region_sums, _combine_region_sums
+
+from calibration.utils import distances
+
+
+class StreamingECE:
+    """
+    Estimate ECE (expected calibration error) of probabilities and targets
+    that are provided in batches with respect to binning scheme `binning` and
+    distance measure `distance`.
+
+    Only the number of samples and the sums of probabilities and targets in
+    each non-empty bin are stored. Hence the bins of binning scheme `binning`
+    may not depend on the data. If `binning` is `None` (the default), a
+    binning scheme with 10 bins of uniform size along each dimension is used.
+    """
+
+    def __init__(self, distance=distances.tvdistance, binning=None):
+        if binning is None:
+            binning = UniformBinning(bins=10)
+
+        if getattr(binning, "data_dependent", True):
+            raise ValueError(
+                "Expected binning scheme whose bins do not depend on the data "
+                "(got {!r})".format(binning))
+
+        self.distance = distance
+        self.binning = binning
+
+        # keys of the non-empty bins (see `_region_keys`) and their statistics
+        self.regions = None
+        self.counts = None
+        self.probs_sums = None
+        self.y_sums = None
+
+    def update(self, probs, y):
+        """
+        Add probabilities `probs` with corresponding targets `y`.
+
+        Probabilities `probs` should be an array of shape `(N,)` or `(N, C)`,
+        where `N` is the number of data points and `C` is the number of
+        targets. If `probs` is a vector of shape `(N,)`, its entries are
+        interpreted as the probabilities of the first target in a binary
+        classification problem. Targets `y` should be an array of shape
+        `(N, C)` with one-hot encoded rows or an array of shape `(N,)` with
+        entries in `(0, ..., C-1)`.
+        """
+        _check_targets(probs, y)
+        self._check_nclasses(probs.shape[1] if probs.ndim > 1 else 2)
+
+        # compute statistics of the non-empty bins of the batch
+        self._add(*_region_sums(self.binning, probs, y))
+
+        return self
+
+    def merge(self, other):
+        """Add statistics of accumulator `other`."""
+        if type(other.binning) is not type(self.binning) or \
+                repr(other.binning) != repr(self.binning):
+            raise ValueError(
+                'Expected binning scheme {!r} (got {!r})'
+                .format(self.binning, other.binning))
+
+        if other.regions is not None:
+            self._check_nclasses(other.probs_sums.shape[1])
+            self._add(other.regions, other.counts, other.probs_sums,
+                      other.y_sums)
+
+        return self
+
+    def compute(self):
+        """Return estimate of the ECE of all data added so far."""
+        if self.regions is None:
+            raise ValueError('Expected at least one batch of data')
+
+        return ece_sums(self.counts, self.probs_sums, self.y_sums,
+                        self.distance)
+
+    def _check_nclasses(self, nclasses):
+        """Check that the number of targets `nclasses` matches the number of
+        targets of the data added so far."""
+        if self.regions is not None and \
+                nclasses != self.probs_sums.shape[1]:
+            raise ValueError(
+                'Expected number of targets ({}) to match number of targets '
+                '({}).'.format(nclasses, self.probs_sums.shape[1]))
+
+    def _add(self, regions, counts, probs_sums, y_sums):
+        """Add statistics of bins `regions`."""
+        if self.regions is not None:
+            regions = np.concatenate([self.regions, regions])
+            counts = np.concatenate([self.counts, counts])
+            probs_sums = np.concatenate([self.probs_sums, probs_sums])
+            y_sums = np.concatenate([self.y_sums, y_sums])
+
+        # combine statistics of the same bins
+        self.regions, self.counts, self.probs_sums, self.y_sums = \
+            _combine_region_sums(regions, counts, probs_sums, y_sums)
+
+    def __repr__(self):
+        return "StreamingECE(distance=%r, binning=%r)" % (self.distance,
+                                                          self.binning)
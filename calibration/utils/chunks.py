@@ -0,0 +1,79 @@
+import numpy as np
+
+
+def chunk_slices(N, chunksize=None):
+    """
+    Return list of slices that split up `N` data points in chunks of at most
+    `chunksize` data points.
+
+    If `chunksize` is `None` (the default), a single chunk is used.
+    """
+    if chunksize is None or chunksize >= N:
+        return [slice(0, N)]
+
+    if chunksize < 1:
+        raise ValueError(
+            "'chunksize' must be a positive number (got {})".format(chunksize))
+
+    return [slice(start, start + chunksize)
+            for start in range(0, N, chunksize)]
+
+
+def map_chunks(func, chunksize, *data):
+    """
+    Evaluate function `func` on chunks of at most `chunksize` data points of
+    arrays `data` and return the stacked outputs.
+
+    Function `func` should return a tuple of arrays whose first dimension
+    corresponds to the data points. The outputs of all chunks are written to
+    preallocated arrays, so that only the intermediate results of a single
+    chunk are kept in memory.
+    """
+    slices = chunk_slices(data[0].shape[0], chunksize)
+    if len(slices) == 1:
+        return func(*data)
+
+    out = None
+    for s in slices:
+        chunk_out = func(*(x[s] for x in data))
+
+        if out is None:
+            out = tuple(np.empty((data[0].shape[0],) + x.shape[1:],
+                                 dtype=x.dtype) for x in chunk_out)
+
+        for x, chunk_x in zip(out, chunk_out):
+            x[s] = chunk_x
+
+    return out
+
+
+def score_chunks(func, chunksize, probs, y, per_sample=False):
+    """
+    Evaluate function `func` on chunks of at most `chunksize` data points of
+    probabilities `probs` and targets `y`, and return the mean of its values
+    along the data points.
+
+    Probabilities `probs` should be an array of shape `(..., N, C)`, where
+    `N` is the number of data points, and targets `y` an array of shape
+    `(N,)`. Function `func` should return an array of shape `(..., N)` with
+    one value for every data point. If `per_sample` is `True`, these values
+    are returned instead of their mean.
+    """
+    N = probs.shape[-2]
+    slices = chunk_slices(N, chunksize)
+    if len(slices) == 1:
+        values = func(probs, y)
+        return values if per_sample else np.mean(values, axis=-1)
+
+    if per_sample:
+        out = None
+        for s in slices:
+            chunk_out = func(probs[..., s, :], y[s])
+            if out is None:
+                out = np.empty(chunk_out.shape[:-1] + (N,),
+                               dtype=chunk_out.dtype)
+            out[..., s] = chunk_out
+        return out
+
+    return sum(np.sum(func(probs[..., s, :], y[s]), axis=-1)
+               for s in slices) / N
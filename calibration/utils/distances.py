@@ -1,26 +1,77 @@
+"""
+Distance measures of probability vectors.
+
+All distance measures are evaluated along the last axis, i.e., for arrays
+`x` and `y` of shape `(..., C)` (such as `(B, C)` for the averages of `B`
+bins) an array of shape `(...)` is returned. If `weights` of shape `(..., B)`
+is provided, the weighted sum of the distances along the last batch axis is
+returned instead. The result is written to array `out` if it is not `None`.
+"""
 import numpy as np
 
 
 # functional implementation
 
-def l1distance(x, y):
-    return np.linalg.norm(np.subtract(x, y), ord=1, axis=-1)
+def l1distance(x, y, out=None, weights=None):
+    diff = np.subtract(x, y)
+    return _reduce(np.abs(diff, out=diff), out, weights)
 
 
-def tvdistance(x, y):
-    return np.linalg.norm(np.subtract(x, y), ord=1, axis=-1) / 2
+def tvdistance(x, y, out=None, weights=None):
+    diff = np.subtract(x, y)
+    return _weight(_reduce(np.abs(diff, out=diff), None, None) / 2, out,
+                   weights)
 
 
-def l2distance(x, y):
-    return np.linalg.norm(np.subtract(x, y), ord=2, axis=-1)
+def l2distance(x, y, out=None, weights=None):
+    return _weight(np.sqrt(squared_l2distance(x, y)), out, weights)
+
+
+def squared_l2distance(x, y, out=None, weights=None):
+    diff = np.subtract(x, y)
+    return _reduce(np.square(diff, out=diff), out, weights)
+
+
+def kldivergence(x, y, out=None, weights=None):
+    # Kullback-Leibler divergence of distribution `y` from distribution `x`,
+    # i.e., of the outcomes from the predictions (with `0 log 0 = 0`)
+    y = np.asarray(y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = np.where(y > 0, y * np.log(y / x), 0)
+    return _reduce(terms, out, weights)
+
+
+def hellingerdistance(x, y, out=None, weights=None):
+    diff = np.subtract(np.sqrt(x), np.sqrt(y))
+    d = _reduce(np.square(diff, out=diff), None, None)
+    return _weight(np.sqrt(d / 2), out, weights)
+
+
+def _reduce(terms, out, weights):
+    """Sum `terms` along the last axis and apply `weights`."""
+    if weights is None:
+        return np.sum(terms, axis=-1, out=out)
+
+    return _weight(np.sum(terms, axis=-1), out, weights)
+
+
+def _weight(d, out, weights):
+    """Return weighted sum of distances `d` or copy them to `out`."""
+    if weights is None:
+        if out is None:
+            return d
+        out[...] = d
+        return out
+
+    return np.sum(np.multiply(weights, d), axis=-1, out=out)
 
 
 # state-full implementation
 
 class L1Distance:
 
-    def __call__(self, x, y):
-        return l1distance(x, y)
+    def __call__(self, x, y, out=None, weights=None):
+        return l1distance(x, y, out=out, weights=weights)
 
     def __repr__(self):
         return "L1Distance"
@@ -28,8 +79,8 @@ class L1Distance:
 
 class TVDistance:
 
-    def __call__(self, x, y):
-        return tvdistance(x, y)
+    def __call__(self, x, y, out=None, weights=None):
+        return tvdistance(x, y, out=out, weights=weights)
 
     def __repr__(self):
         return "TVDistance"
@@ -37,8 +88,35 @@ class TVDistance:
 
 class L2Distance:
 
-    def __call__(self, x, y):
-        return l2distance(x, y)
+    def __call__(self, x, y, out=None, weights=None):
+        return l2distance(x, y, out=out, weights=weights)
 
     def __repr__(self):
         return "L2Distance"
+
+
+class SquaredL2Distance:
+
+    def __call__(self, x, y, out=None, weights=None):
+        return squared_l2distance(x, y, out=out, weights=weights)
+
+    def __repr__(self):
+        return "SquaredL2Distance"
+
+
+class KLDivergence:
+
+    def __call__(self, x, y, out=None, weights=None):
+        return kldivergence(x, y, out=out, weights=weights)
+
+    def __repr__(self):
+        return "KLDivergence"
+
+
+class HellingerDistance:
+
+    def __call__(self, x, y, out=None, weights=None):
+        return hellingerdistance(x, y, out=out, weights=weights)
+
+    def __repr__(self):
+        return "HellingerDistance"
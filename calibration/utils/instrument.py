@@ -0,0 +1,164 @@
+import contextlib
+import time
+import tracemalloc
+
+
+# active instrumentations; stages and metrics are only recorded if it is
+# not empty
+_active = []
+
+# shared context manager of stages that are not recorded
+_NULL = contextlib.nullcontext()
+
+
+def instrument(memory=False, callback=None):
+    """
+    Return an `Instrumentation` that records the stages of all computations
+    within a `with` block.
+
+    ```python
+    with instrument() as record:
+        stats.ece(probs, y)
+    record.to_dict()
+    ```
+    """
+    return Instrumentation(memory=memory, callback=callback)
+
+
+class Instrumentation:
+    """
+    Record the stages of all computations within a `with` block.
+
+    Every stage is recorded with its name, the names of the stages that
+    contain it, and its duration. If `memory` is `True`, the peak memory
+    that is allocated during a stage (measured with `tracemalloc`) is
+    recorded as well, which slows down the computations. Additional metrics,
+    such as the number of bins of a binning tree or its depth, are recorded
+    with their values. If `callback` is not `None`, it is called with every
+    recorded event (a dictionary).
+
+    Nothing is recorded outside of `with` blocks, and then the overhead of
+    the instrumentation is negligible.
+    """
+
+    def __init__(self, memory=False, callback=None):
+        self.memory = memory
+        self.callback = callback
+        self.events = []
+        self._stack = []
+
+    def __enter__(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._stop_tracing = True
+        else:
+            self._stop_tracing = False
+
+        _active.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _active.remove(self)
+
+        if self._stop_tracing:
+            tracemalloc.stop()
+
+    def _enter_stage(self, name):
+        entry = {"name": name, "start": time.perf_counter()}
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                parent = self._stack[-1]
+                parent["peak"] = max(parent["peak"], peak)
+            tracemalloc.reset_peak()
+            entry["memory"] = entry["peak"] = current
+        self._stack.append(entry)
+
+    def _exit_stage(self):
+        duration = time.perf_counter() - self._stack[-1]["start"]
+        path = "/".join(x["name"] for x in self._stack)
+        entry = self._stack.pop()
+
+        event = {"stage": path, "duration": duration}
+        if self.memory:
+            entry["peak"] = max(entry["peak"],
+                                tracemalloc.get_traced_memory()[1])
+            event["bytes"] = entry["peak"] - entry["memory"]
+            if self._stack:
+                parent = self._stack[-1]
+                parent["peak"] = max(parent["peak"], entry["peak"])
+            tracemalloc.reset_peak()
+
+        self._add(event)
+
+    def _metric(self, name, value):
+        path = "/".join([x["name"] for x in self._stack] + [name])
+        self._add({"metric": path, "value": value})
+
+    def _add(self, event):
+        self.events.append(event)
+        if self.callback is not None:
+            self.callback(event)
+
+    def to_dict(self):
+        """
+        Return the recorded stages and metrics as a dictionary.
+
+        The stages are summarized by the number of calls, the total duration,
+        and the largest peak memory (if recorded); metrics are given by the
+        list of their recorded values.
+        """
+        stages = {}
+        metrics = {}
+        for event in self.events:
+            if "stage" in event:
+                stage = stages.setdefault(event["stage"],
+                                          {"calls": 0, "duration": 0.0})
+                stage["calls"] += 1
+                stage["duration"] += event["duration"]
+                if "bytes" in event:
+                    stage["bytes"] = max(stage.get("bytes", 0),
+                                         event["bytes"])
+            else:
+                metrics.setdefault(event["metric"], []).append(event["value"])
+
+        return {"stages": stages, "metrics": metrics}
+
+    def __repr__(self):
+        return "Instrumentation(memory=%r, callback=%r)" % (
+            self.memory, self.callback)
+
+
+class _Stage:
+    """Context manager that records a stage in all active
+    instrumentations."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        for x in _active:
+            x._enter_stage(self.name)
+
+    def __exit__(self, *exc):
+        for x in reversed(_active):
+            x._exit_stage()
+
+
+def enabled():
+    """Return whether stages and metrics are recorded."""
+    return bool(_active)
+
+
+def stage(name):
+    """Return context manager that records stage `name`."""
+    if not _active:
+        return _NULL
+
+    return _Stage(name)
+
+
+def metric(name, value):
+    """Record metric `name` with value `value`."""
+    for x in _active:
+        x._metric(name, value)
@@ -0,0 +1,70 @@
+import numpy as np
+
+
+def check_rng(rng):
+    """
+    Return random number generator for `rng`.
+
+    Random number generator `rng` can be `None`, an integer or a
+    `np.random.SeedSequence`, a `np.random.BitGenerator`, or a
+    `np.random.Generator`. If `rng` is `None`, `None` is returned, which
+    indicates that the legacy global random state `np.random` is used.
+    Integers and seed sequences are used to seed a generator with bit
+    generator `np.random.PCG64`.
+
+    Classes such as `ECE` or `BootstrapECE` convert their random number
+    generator with this function once, when they are constructed. Hence
+    repeated calls of the same object continue the random stream and yield
+    different results, whereas the sequence of results is reproducible for
+    objects that are constructed with the same seed.
+    """
+    if rng is None or isinstance(rng, np.random.Generator):
+        return rng
+
+    if isinstance(rng, np.random.BitGenerator):
+        return np.random.Generator(rng)
+
+    return np.random.Generator(np.random.PCG64(rng))
+
+
+def spawn_rngs(rng, n):
+    """
+    Return list of `n` independent random number generators spawned from
+    random number generator `rng`.
+
+    The new generators use the same bit generator as `rng` (such as
+    `np.random.PCG64` or `np.random.Philox`), and they are seeded with
+    seed sequences spawned from the seed sequence of `rng`, so that every
+    generator yields an independent stream of random numbers that only
+    depends on `rng` and its position in the list. If `rng` is `None`, the
+    generators are seeded with fresh entropy from the operating system.
+    """
+    rng = check_rng(rng)
+    if rng is None:
+        rng = np.random.Generator(np.random.PCG64())
+
+    bit_generator = type(rng.bit_generator)
+    return [np.random.Generator(bit_generator(seed))
+            for seed in rng.bit_generator.seed_seq.spawn(n)]
+
+
+def randint(rng, high, size=None):
+    """
+    Draw integers from `(0, ..., high-1)` with random number generator `rng`
+    or the global random state if `rng` is `None`.
+    """
+    if rng is None:
+        return np.random.randint(0, high, size=size)
+
+    return rng.integers(0, high, size=size)
+
+
+def uniform(rng, size=None):
+    """
+    Draw samples from the uniform distribution on `[0, 1)` with random number
+    generator `rng` or the global random state if `rng` is `None`.
+    """
+    if rng is None:
+        return np.random.uniform(size=size)
+
+    return rng.random(size=size)
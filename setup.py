@@ -10,7 +10,7 @@ setuptools.setup(
     author="Carl Andersson, David Widmann",
     author_email="carl.andersson@it.uu.se, david.widmann@it.uu.se",
     description="Tools for calibration evaluation",
-    install_requires=['anytree', 'numpy'],
+    install_requires=['numpy'],
     test_suite="test",
     tests_require=['scipy'],
     license="MIT",
@@ -1,7 +1,42 @@
+import os
+import tempfile
 import unittest
 
 import numpy as np
 import calibration.binning as binning
+import calibration.stats as stats
+
+
+class RecursiveBinning(binning.DataDependentBinning):
+    """Reference implementation of `DataDependentBinning` that splits every
+    node recursively and computes its variances and threshold directly."""
+
+    def split(self, tree, allprobs):
+        self._split(tree, allprobs, 0, 0, allprobs.shape[0])
+
+    def _split(self, tree, allprobs, node, start, stop):
+        indices = tree.indices[start:stop]
+        n = indices.size
+        probs = allprobs[indices]
+        if n < self.min_size:
+            return
+
+        split_axis = np.argmax(np.var(probs, axis=0))
+        split_probs = probs[:, split_axis]
+        split_threshold = self.threshold(split_probs)
+
+        low_probs = split_probs < split_threshold
+        number_low_probs = np.sum(low_probs)
+        if number_low_probs == 0 or number_low_probs == n:
+            return
+
+        indices[:] = np.concatenate([indices[low_probs],
+                                     indices[~low_probs]])
+        middle = start + number_low_probs
+        low_node, high_node = tree.split(node, split_axis, split_threshold,
+                                         [0, 1], [start, middle, stop])
+        self._split(tree, allprobs, low_node, start, middle)
+        self._split(tree, allprobs, high_node, middle, stop)
 
 
 class TestBinning(unittest.TestCase):
@@ -60,6 +95,110 @@ class TestBinning(unittest.TestCase):
         for a, b in zip(tree.bin_data(y), binned_y):
             self.assertTrue(np.all(np.equal(a, b)))
 
+    def test_uniform_multiclass(self):
+        # example data set
+        np.random.seed(1234)
+        probs = np.random.dirichlet(np.ones(4), 1000)
+
+        # tree with 5 bins along each dimension
+        tree = binning.BinningTree(binning.UniformBinning(5)).fit(probs)
+
+        # bins are ordered lexicographically by the regions along the
+        # first three dimensions
+        regions = np.digitize(probs[:, :-1], [0.2, 0.4, 0.6, 0.8])
+        _, binnumbers = np.unique(regions, axis=0, return_inverse=True)
+        self.assertTrue(np.array_equal(tree.binnumbers,
+                                       binnumbers.reshape(-1)))
+
+        # indices in each bin are sorted
+        for b in tree.bins:
+            self.assertTrue(np.all(np.diff(b) > 0))
+
+        # every leaf of the tree is split along all previous dimensions
+        self.assertTrue(np.all(tree.split_axis[tree.node_parent[tree.leaves]]
+                               == 2))
+
+    def test_predict(self):
+        # example data set
+        np.random.seed(1234)
+        probs = np.random.dirichlet(np.ones(3), 1000)
+
+        for alg in (binning.UniformBinning(5),
+                    binning.DataDependentBinning(min_size=100)):
+            tree = binning.BinningTree(alg).fit(probs[:500])
+
+            # data points to which the tree was fit are assigned to their bins
+            self.assertTrue(np.array_equal(tree.predict(probs[:500]),
+                                           tree.binnumbers))
+
+            # new data points are assigned to bins with the same boundaries
+            binnumbers = tree.predict(probs[500:])
+            for i, b in enumerate(tree.bins):
+                low = np.min(probs[b], axis=0)
+                high = np.max(probs[b], axis=0)
+                inbin = np.all((probs[500:] >= low) & (probs[500:] <= high),
+                               axis=1)
+                self.assertTrue(np.all(binnumbers[inbin] == i))
+
+        # regions without bins are assigned bin number -1
+        tree = binning.BinningTree(binning.UniformBinning(5)).fit(
+            np.array([0.1, 0.9]))
+        self.assertTrue(np.array_equal(tree.predict(np.array([0.15, 0.5])),
+                                       [0, -1]))
+
+    def test_dependent_reference(self):
+        # same bins as the recursive reference implementation, also for
+        # binary probabilities whose two axes have equal variances
+        for seed in range(20):
+            np.random.seed(seed)
+            for probs in [np.random.rand(1000),
+                          np.random.dirichlet(np.ones(3), 1000)]:
+                y = np.random.randint(0, 2, 1000) if probs.ndim == 1 else \
+                    np.random.randint(0, 3, 1000)
+                for threshold in ["mean", "median"]:
+                    alg = binning.DataDependentBinning(min_size=50,
+                                                       threshold=threshold)
+                    ref = RecursiveBinning(min_size=50, threshold=threshold)
+                    tree = binning.BinningTree(alg).fit(probs)
+                    ref_tree = binning.BinningTree(ref).fit(probs)
+
+                    self.assertTrue(np.array_equal(tree.binnumbers,
+                                                   ref_tree.binnumbers))
+                    self.assertTrue(np.array_equal(tree.split_axis,
+                                                   ref_tree.split_axis))
+                    self.assertEqual(stats.ece(probs, y, binning=alg),
+                                     stats.ece(probs, y, binning=ref))
+
+    def test_save_load(self):
+        # example data set
+        np.random.seed(1234)
+        probs = np.random.dirichlet(np.ones(3), 1000)
+        tree = binning.BinningTree(binning.DataDependentBinning(
+            min_size=100)).fit(probs)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            # save and load tree with sample indices
+            path = os.path.join(tmpdir, 'tree.npz')
+            tree.save(path)
+            loaded = binning.BinningTree.load(path)
+
+            self.assertTrue(np.array_equal(loaded.binnumbers,
+                                           tree.binnumbers))
+            self.assertTrue(np.array_equal(loaded.predict(probs),
+                                           tree.binnumbers))
+            for a, b in zip(loaded.bin_data(probs), tree.bin_data()):
+                self.assertTrue(np.array_equal(a, b))
+            self.assertEqual(loaded.alg_repr, repr(tree.alg))
+
+            # save and load tree without sample indices
+            tree.save(path, indices=False)
+            loaded = binning.BinningTree.load(path)
+
+            self.assertTrue(np.array_equal(loaded.predict(probs),
+                                           tree.binnumbers))
+            with self.assertRaises(Exception):
+                loaded.bins
+
     def test_dependent(self):
         # example data set
         np.random.seed(1234)
@@ -86,6 +225,88 @@ class TestBinning(unittest.TestCase):
         for a, b in zip(tree.bins, bins):
             self.assertTrue(np.all(np.equal(a, b)))
 
+        # median splits yield bins of equal size
+        tree = binning.BinningTree(binning.DataDependentBinning(
+            min_size=100, threshold="median"))
+        tree.fit(probs1D[:1024])
+        self.assertEqual(tree.nbins, 16)
+        for b in tree.bins:
+            self.assertEqual(b.size, 64)
+
+    def test_cache(self):
+        np.random.seed(1234)
+        probs = np.random.dirichlet(np.ones(3), 100)
+        cache = binning.BinningCache(maxsize=2)
+        uniform = binning.UniformBinning(5)
+        dependent = binning.DataDependentBinning(min_size=10)
+
+        # fitted trees share their bin numbers if they are reused
+        def cached(tree):
+            return cache.fit(tree.alg, tree.probs).binnumbers is \
+                tree.binnumbers
+
+        # fitted trees are reused for the same probabilities and schemes
+        tree = cache.fit(uniform, probs)
+        self.assertIs(tree.probs, probs)
+        self.assertTrue(cached(tree))
+        self.assertIs(cache.fit(binning.UniformBinning(5), probs).probs,
+                      probs)
+        self.assertIsNot(cache.fit(binning.UniformBinning(4), probs)
+                         .binnumbers, tree.binnumbers)
+        probs_copy = probs.copy()
+        self.assertIsNot(cache.fit(uniform, probs_copy).binnumbers,
+                         tree.binnumbers)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (2, 3, 2))
+        self.assertTrue(np.array_equal(
+            tree.binnumbers,
+            binning.BinningTree(uniform).fit(probs).binnumbers))
+
+        # least recently used trees are removed
+        self.assertFalse(cached(tree))
+
+        # explicit invalidation removes the trees of both binning schemes
+        tree = cache.fit(dependent, probs)
+        cache.invalidate(probs)
+        self.assertEqual(len(cache), 0)
+        self.assertFalse(cached(tree))
+        cache.clear()
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 0, 0))
+
+        # probabilities are not kept alive by the cache
+        probs2 = probs.copy()
+        cache.fit(uniform, probs2)
+        self.assertEqual(len(cache), 1)
+        del probs2
+        self.assertEqual(len(cache), 0)
+
+        # hashing finds copies of the probabilities
+        cache = binning.BinningCache(hash_data=True)
+        tree = cache.fit(uniform, probs)
+        self.assertIs(cache.fit(uniform, probs.copy()).binnumbers,
+                      tree.binnumbers)
+
+    def test_instrument(self):
+        probs = np.array([0.0, 0.5, 0.2, 0.7, 1.0, 0.95])
+        tree = binning.BinningTree(binning.UniformBinning(5))
+
+        # nothing is recorded outside of the block
+        events = []
+        with binning.instrument(callback=events.append) as record:
+            tree.fit(probs)
+            tree.predict(probs)
+        tree.fit(probs)
+        self.assertEqual(record.events, events)
+
+        # stages and metrics of the binning tree
+        result = record.to_dict()
+        self.assertEqual(result["stages"]["binning.fit"]["calls"], 1)
+        self.assertIn("binning.fit/split", result["stages"])
+        self.assertIn("binning.predict", result["stages"])
+        self.assertEqual(result["metrics"]["binning.fit/nbins"], [5])
+        self.assertEqual(result["metrics"]["binning.fit/depth"],
+                         [tree.depth])
+        self.assertEqual(tree.depth, 1)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+import numpy as np
+from calibration.utils import distances
+
+
+class TestDistances(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(1234)
+        self.x = np.random.dirichlet(np.ones(5), 20)
+        self.y = np.random.dirichlet(np.ones(5), 20)
+        self.weights = np.random.dirichlet(np.ones(20))
+
+    def test_distances(self):
+        diff = self.x - self.y
+        expected = {
+            distances.l1distance: np.sum(np.abs(diff), axis=-1),
+            distances.tvdistance: np.sum(np.abs(diff), axis=-1) / 2,
+            distances.l2distance: np.sqrt(np.sum(diff**2, axis=-1)),
+            distances.squared_l2distance: np.sum(diff**2, axis=-1),
+            distances.kldivergence: np.sum(
+                self.y * np.log(self.y / self.x), axis=-1),
+            distances.hellingerdistance: np.sqrt(np.sum(
+                (np.sqrt(self.x) - np.sqrt(self.y))**2, axis=-1) / 2),
+        }
+
+        for distance, d in expected.items():
+            # batched evaluation
+            self.assertTrue(np.allclose(distance(self.x, self.y), d))
+
+            # single probability vectors
+            self.assertAlmostEqual(distance(self.x[0], self.y[0]), d[0])
+
+            # output buffer
+            out = np.empty(20)
+            self.assertIs(distance(self.x, self.y, out=out), out)
+            self.assertTrue(np.allclose(out, d))
+
+            # weighted sum
+            self.assertAlmostEqual(
+                distance(self.x, self.y, weights=self.weights),
+                np.dot(self.weights, d))
+
+    def test_kldivergence(self):
+        # outcomes with zero probability do not contribute
+        x = np.array([0.5, 0.5])
+        y = np.array([1.0, 0.0])
+        self.assertAlmostEqual(distances.kldivergence(x, y), np.log(2))
+        self.assertEqual(distances.kldivergence(y, x), np.inf)
+
+
+if __name__ == '__main__':
+    unittest.main()
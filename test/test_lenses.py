@@ -50,6 +50,23 @@ class TestLenses(unittest.TestCase):
         self.assertTrue(np.array_equal(groups_probs3, groups_probs))
         self.assertTrue(np.array_equal(groups_y3, groups_y))
 
+        # check groups of arbitrary targets
+        groups = np.array_split(np.random.permutation(10), 4)
+        lens = lenses.GroupLens(groups=groups)
+        groups_probs4, groups_y4 = lens(self.probs, self.y)
+
+        for i, g in enumerate(groups):
+            self.assertTrue(
+                np.array_equal(groups_probs4[:, i],
+                               np.sum(self.probs[:, g], axis=-1)))
+            self.assertTrue(np.array_equal(groups_y4 == i,
+                                           np.isin(self.y, g)))
+
+        # check that groups are validated
+        lens = lenses.GroupLens(groups=groups[:-1])
+        with self.assertRaises(ValueError):
+            lens(self.probs, self.y)
+
     def test_maximum(self):
         # functional implementation
         max_probs, max_y = lenses.maximum_lens(self.probs, self.y)
@@ -83,6 +100,13 @@ class TestLenses(unittest.TestCase):
         self.assertTrue(np.array_equal(max_probs0_full[:, 0], max_probs0))
         self.assertTrue(np.array_equal(max_y0_full, max_y0))
 
+        # check that data can be processed in chunks
+        max_probs_chunks, max_y_chunks = lenses.maximum_lens(
+            self.probs, self.y, chunksize=999)
+
+        self.assertTrue(np.array_equal(max_probs_chunks, max_probs))
+        self.assertTrue(np.array_equal(max_y_chunks, max_y))
+
         # state-full implementation
         lens = lenses.MaximumLens()
         max_probs2, max_y2 = lens(self.probs, self.y)
@@ -113,6 +137,13 @@ class TestLenses(unittest.TestCase):
         self.assertTrue(np.array_equal(top_probs_onehot, top_probs))
         self.assertTrue(np.array_equal(top_y_onehot, np.eye(3)[top_y]))
 
+        # check that data can be processed in chunks
+        top_probs_chunks, top_y_chunks = lenses.top2_lens(
+            self.probs, self.y_onehot, chunksize=999)
+
+        self.assertTrue(np.array_equal(top_probs_chunks, top_probs))
+        self.assertTrue(np.array_equal(top_y_chunks, top_y_onehot))
+
         # state-full implementation
         lens = lenses.Top2Lens()
         top_probs2, top_y2 = lens(self.probs, self.y)
@@ -120,6 +151,51 @@ class TestLenses(unittest.TestCase):
         self.assertTrue(np.array_equal(top_probs2, top_probs))
         self.assertTrue(np.array_equal(top_y2, top_y))
 
+    def test_topk(self):
+        # functional implementation
+        top_probs, top_y = lenses.topk_lens(self.probs, self.y, 5)
+
+        # check that each row is a probability vector
+        self.assertTrue(np.allclose(np.sum(top_probs, axis=1), 1))
+
+        # check that the new targets correspond to the old targets of the
+        # most confident predictions in decreasing order
+        sorted_idxs = np.argsort(-self.probs, axis=1)
+        self.assertTrue(
+            np.array_equal(top_probs[:, :5],
+                           -np.sort(-self.probs, axis=1)[:, :5]))
+        for i in range(5):
+            self.assertTrue(np.array_equal(top_y == i,
+                                           sorted_idxs[:, i] == self.y))
+
+        # check that one-hot encoded targets yield same results
+        top_probs_onehot, top_y_onehot = lenses.topk_lens(
+            self.probs, self.y_onehot, 5)
+
+        self.assertTrue(np.array_equal(top_probs_onehot, top_probs))
+        self.assertTrue(np.array_equal(top_y_onehot, np.eye(6)[top_y]))
+
+        # check that data can be processed in chunks
+        top_probs_chunks, top_y_chunks = lenses.topk_lens(
+            self.probs, self.y, 5, chunksize=999)
+
+        self.assertTrue(np.array_equal(top_probs_chunks, top_probs))
+        self.assertTrue(np.array_equal(top_y_chunks, top_y))
+
+        # check that the top-2 lens is a special case
+        top2_probs, top2_y = lenses.topk_lens(self.probs, self.y, 2)
+        top2_probs2, top2_y2 = lenses.top2_lens(self.probs, self.y)
+
+        self.assertTrue(np.array_equal(top2_probs, top2_probs2))
+        self.assertTrue(np.array_equal(top2_y, top2_y2))
+
+        # state-full implementation
+        lens = lenses.TopKLens(5)
+        top_probs2, top_y2 = lens(self.probs, self.y)
+
+        self.assertTrue(np.array_equal(top_probs2, top_probs))
+        self.assertTrue(np.array_equal(top_y2, top_y))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -82,6 +82,50 @@ class TestSamples(unittest.TestCase):
         self.assertTrue(np.array_equal(results_x, results2_x))
         self.assertTrue(np.array_equal(results_y, results2_y))
 
+    def test_resample_stats_parallel(self):
+        # use mean as statistic
+        x = np.arange(100)
+
+        # results with seeds do not depend on number of processes
+        results = sample.resample_stats(np.mean, x, n=50, rng=1234)
+        results2 = sample.resample_stats(np.mean, x, n=50, rng=1234,
+                                         n_jobs=2)
+        self.assertEqual(len(results), 50)
+        self.assertTrue(np.array_equal(results, results2))
+
+        # global random state is not modified
+        np.random.seed(1234)
+        state = np.random.uniform()
+        np.random.seed(1234)
+        sample.ResampleStats(np.mean, n=50, rng=1234)(x)
+        self.assertEqual(np.random.uniform(), state)
+
+    def test_rng(self):
+        probs = np.random.dirichlet(np.ones(5), 100)
+
+        # random number generators can be specified by seeds
+        targets = sample.consistent_targets(probs, rng=1234)
+        targets2 = sample.consistent_targets(
+            probs, rng=np.random.Generator(np.random.PCG64(1234)))
+        self.assertTrue(np.array_equal(targets, targets2))
+
+        # generators are advanced by the state-full implementation
+        sampler = sample.ConsistentTargets(rng=1234)
+        self.assertTrue(np.array_equal(sampler(probs), targets))
+        self.assertFalse(np.array_equal(sampler(probs), targets))
+
+        # replicates use independent generators with the same bit generator
+        x = np.arange(100)
+        results = sample.resample_stats(np.mean, x, n=20, rng=1234)
+        results2 = sample.resample_stats(
+            np.mean, x, n=20, rng=np.random.Generator(np.random.PCG64(1234)))
+        self.assertTrue(np.array_equal(results, results2))
+        self.assertEqual(len(np.unique(results)), 20)
+
+        rng = np.random.Generator(np.random.Philox(1234))
+        results3 = sample.resample_stats(np.mean, x, n=20, rng=rng)
+        self.assertFalse(np.array_equal(results, results3))
+
 
 if __name__ == '__main__':
     unittest.main()
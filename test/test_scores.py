@@ -2,6 +2,7 @@ import unittest
 
 import numpy as np
 import calibration.scores as scores
+import calibration.sample as sample
 
 
 class TestScores(unittest.TestCase):
@@ -20,6 +21,11 @@ class TestScores(unittest.TestCase):
         self.assertEqual(score_best, 0)
         self.assertEqual(score_worst, np.inf)
 
+        # check that probabilities of the targets can be clipped
+        self.assertAlmostEqual(
+            scores.logarithmic_score(self.probs_worst, self.y, clip=1e-10),
+            -np.log(1e-10))
+
         # state-full implementation
         score = scores.LogarithmicScore()
 
@@ -34,12 +40,67 @@ class TestScores(unittest.TestCase):
         self.assertEqual(score_best, -1)
         self.assertEqual(score_worst, 1)
 
+        # check that data can be processed in chunks
+        self.assertAlmostEqual(
+            scores.quadratic_score(self.probs_worst, self.y, chunksize=3),
+            score_worst)
+
         # state-full implementation
         score = scores.QuadraticScore()
 
         self.assertEqual(score_best, score(self.probs_best, self.y))
         self.assertEqual(score_worst, score(self.probs_worst, self.y))
 
+    def test_batched(self):
+        # stack probabilities of different models
+        probs = np.random.dirichlet(np.ones(5), (3, 20))
+
+        for score in (scores.logarithmic_score, scores.quadratic_score,
+                      scores.spherical_score):
+            expected = np.array([score(x, self.y) for x in probs])
+            self.assertTrue(np.allclose(score(probs, self.y), expected))
+            self.assertTrue(np.allclose(score(probs, self.y, chunksize=7),
+                                        expected))
+
+            # check scores of the individual data points
+            per_sample = score(probs, self.y, per_sample=True)
+            self.assertEqual(per_sample.shape, (3, 20))
+            self.assertTrue(np.allclose(np.mean(per_sample, axis=-1),
+                                        expected))
+            self.assertTrue(np.array_equal(
+                score(probs, self.y, chunksize=7, per_sample=True),
+                per_sample))
+
+    def test_bootstrap(self):
+        probs = np.random.dirichlet(np.ones(5), 20)
+
+        for score in (scores.quadratic_score, scores.spherical_score):
+            # compare with resampling the complete data set
+            np.random.seed(1234)
+            resample = sample.ResampleStats(score, n=100)
+            resample_samples = resample(probs, self.y)
+
+            np.random.seed(1234)
+            orig, interval = scores.bootstrap_score(probs, self.y, score=score,
+                                                    n=100, max_elements=300)
+            self.assertEqual(orig, score(probs, self.y))
+            self.assertTrue(np.allclose(
+                interval, np.percentile(resample_samples, [2.5, 97.5])))
+
+            # same results with random number generators
+            bootstrap = scores.BootstrapScore(score, n=100, rng=1)
+            self.assertTrue(np.allclose(
+                bootstrap(probs, self.y)[1],
+                scores.bootstrap_score(probs, self.y, score=score, n=100,
+                                       max_elements=70, rng=1)[1]))
+
+        # stacked probabilities of different models
+        probs = np.random.dirichlet(np.ones(5), (3, 20))
+        orig, interval = scores.bootstrap_score(probs, self.y, n=100)
+        self.assertEqual(orig.shape, (3,))
+        self.assertEqual(interval.shape, (2, 3))
+        self.assertTrue(np.all(interval[0] <= interval[1]))
+
     def test_spherical(self):
         # functional implementation
         score_best = scores.spherical_score(self.probs_best, self.y)
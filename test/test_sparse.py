@@ -0,0 +1,90 @@
+import functools
+import unittest
+
+import numpy as np
+import calibration.lenses as lenses
+import calibration.scores as scores
+import calibration.sparse as sparse
+
+
+class TestSparse(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(1234)
+        self.probs = np.random.dirichlet(np.ones(10), 1000)
+        self.y = np.random.randint(0, 10, 1000)
+        self.y_onehot = np.eye(10)[self.y]
+
+    def test_topk_probs(self):
+        topk = sparse.topk_probs(self.probs, 3)
+
+        self.assertEqual(topk.shape, self.probs.shape)
+        self.assertEqual(topk.k, 3)
+        self.assertEqual(len(topk), 1000)
+
+        # check that the most confident predictions are stored in order
+        sorted_probs = -np.sort(-self.probs, axis=1)
+        self.assertTrue(np.array_equal(topk.values, sorted_probs[:, :3]))
+        self.assertTrue(np.allclose(topk.residual,
+                                    np.sum(sorted_probs[:, 3:], axis=1)))
+
+        # check that all targets are recovered
+        dense = sparse.topk_probs(self.probs, 10).toarray()
+        self.assertTrue(np.allclose(dense, self.probs))
+
+        # check that the residual is distributed uniformly
+        dense = topk.toarray()
+        self.assertTrue(np.allclose(np.sum(dense, axis=1), 1))
+        self.assertTrue(np.allclose(sparse.squared_norm(topk),
+                                    np.sum(dense**2, axis=1)))
+        self.assertTrue(np.allclose(
+            sparse.target_probs(topk, self.y),
+            dense[np.arange(1000), self.y]))
+
+    def test_lenses(self):
+        topk = sparse.topk_probs(self.probs, 3)
+
+        for lens in (lenses.maximum_lens, lenses.top2_lens,
+                     functools.partial(lenses.topk_lens, k=3)):
+            # check that sparse and dense probabilities yield same results
+            for y in (self.y, self.y_onehot):
+                new_probs, new_y = lens(topk, y)
+                dense_probs, dense_y = lens(self.probs, y)
+
+                self.assertTrue(np.allclose(new_probs, dense_probs))
+                self.assertTrue(np.array_equal(new_y, dense_y))
+
+            # check that data can be processed in chunks
+            new_probs_chunks, new_y_chunks = lens(topk, self.y, chunksize=99)
+            new_probs, new_y = lens(topk, self.y)
+
+            self.assertTrue(np.array_equal(new_probs_chunks, new_probs))
+            self.assertTrue(np.array_equal(new_y_chunks, new_y))
+
+        with self.assertRaises(ValueError):
+            lenses.top2_lens(sparse.topk_probs(self.probs, 1), self.y)
+
+        # grouped probabilities contain the shares of the residual
+        group_lens = lenses.GroupLens(nclasses=10, ngroups=3, chunksize=99)
+        for y in (self.y, self.y_onehot):
+            new_probs, new_y = group_lens(topk, y)
+            dense_probs, dense_y = group_lens(topk.toarray(), y)
+
+            self.assertTrue(np.allclose(new_probs, dense_probs))
+            self.assertTrue(np.array_equal(new_y, dense_y))
+
+    def test_scores(self):
+        topk = sparse.topk_probs(self.probs, 3)
+        dense = topk.toarray()
+
+        for score in (scores.logarithmic_score, scores.quadratic_score,
+                      scores.spherical_score):
+            # check that sparse and dense probabilities yield same results
+            self.assertAlmostEqual(score(topk, self.y),
+                                   score(dense, self.y))
+            self.assertAlmostEqual(score(topk, self.y, chunksize=99),
+                                   score(dense, self.y))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,14 @@
+import os
+import tempfile
 import unittest
 
 import numpy as np
 import calibration.stats as stats
 import calibration.binning as binning
+import calibration.sample as sample
+import calibration.lenses as lenses
+import calibration.scores as scores
+from calibration.utils import distances
 
 
 class TestStats(unittest.TestCase):
@@ -35,6 +41,320 @@ class TestStats(unittest.TestCase):
         ece_consistent = stats.ece(self.probs, None, binning=binning_scheme)
         self.assertEqual(ece_consistent, ece_binned_consistent)
 
+    def test_ece_sums(self):
+        # use binning scheme with several bins
+        tree = binning.BinningTree(binning.UniformBinning(bins=2)).fit(
+            self.probs)
+
+        # sums of one-hot encoded targets and of labels agree
+        counts, probs_sums, y_sums = stats.binned_sums(
+            tree.binnumbers, tree.nbins, self.probs, self.y)
+        _, _, labels_sums = stats.binned_sums(
+            tree.binnumbers, tree.nbins, self.probs, self.y.argmax(axis=1))
+        self.assertTrue(np.array_equal(y_sums, labels_sums))
+        self.assertEqual(np.sum(counts), self.probs.shape[0])
+
+        # estimates agree with estimates of binned data
+        ece_sums = stats.ece_sums(counts, probs_sums, y_sums)
+        ece_binned = stats.ece_binned(tree.bin_data(), tree.bin_data(self.y))
+        self.assertAlmostEqual(ece_sums, ece_binned)
+        self.assertEqual(stats.ece(self.probs, self.y,
+                                   binning=binning.UniformBinning(bins=2)),
+                         ece_sums)
+
+        # distance measures of single vectors are evaluated for every bin
+        def maxdistance(x, y):
+            return np.max(np.abs(x - y), axis=-1)
+
+        def vector_maxdistance(x, y):
+            return np.max(np.abs(x - y))
+
+        for distance in [maxdistance, vector_maxdistance]:
+            self.assertAlmostEqual(
+                stats.ece_sums(counts, probs_sums, y_sums, distance),
+                stats.ece_sums(counts, probs_sums, y_sums, maxdistance))
+            self.assertAlmostEqual(
+                stats.ece_binned(tree.bin_data(), tree.bin_data(self.y),
+                                 distance),
+                stats.ece_sums(counts, probs_sums, y_sums, maxdistance))
+
+        # distances of wrong shape
+        with self.assertRaises(ValueError):
+            stats.ece_sums(counts, probs_sums, y_sums,
+                           lambda x, y: np.abs(x - y))
+
+    def test_ece_chunks(self):
+        binning_scheme = binning.UniformBinning(bins=2)
+
+        # store data in memory-mapped arrays
+        with tempfile.TemporaryDirectory() as tmpdir:
+            probs = np.lib.format.open_memmap(
+                os.path.join(tmpdir, 'probs.npy'), mode='w+',
+                dtype=self.probs.dtype, shape=self.probs.shape)
+            probs[:] = self.probs
+
+            # estimates agree with estimates of the complete data set
+            self.assertAlmostEqual(
+                stats.ece(probs, self.y, binning=binning_scheme,
+                          chunksize=6),
+                stats.ece(self.probs, self.y, binning=binning_scheme))
+
+            np.random.seed(1234)
+            ece_consistent = stats.ece(probs, None, binning=binning_scheme,
+                                       chunksize=6)
+            np.random.seed(1234)
+            self.assertAlmostEqual(
+                ece_consistent,
+                stats.ece(self.probs, None, binning=binning_scheme))
+
+            del probs
+
+        # bins may not depend on the data
+        with self.assertRaises(ValueError):
+            stats.ece(self.probs, self.y,
+                      binning=binning.DataDependentBinning(), chunksize=6)
+
+    def test_streaming_ece(self):
+        # add data in batches to two accumulators
+        binning_scheme = binning.UniformBinning(bins=2)
+        streaming = stats.StreamingECE(binning=binning_scheme)
+        streaming2 = stats.StreamingECE(binning=binning_scheme)
+        for i in range(0, 20, 6):
+            streaming.update(self.probs[i:i + 6], self.y[i:i + 6])
+            streaming2.update(self.probs[i:i + 6],
+                              self.y[i:i + 6].argmax(axis=1))
+
+        self.assertAlmostEqual(streaming.compute(),
+                               stats.ece(self.probs, self.y,
+                                         binning=binning_scheme))
+        self.assertAlmostEqual(streaming.compute(), streaming2.compute())
+
+        # merge accumulators of different shards
+        shard = stats.StreamingECE(binning=binning_scheme).update(
+            self.probs[:10], self.y[:10])
+        shard2 = stats.StreamingECE(binning=binning_scheme).update(
+            self.probs[10:], self.y[10:])
+        self.assertAlmostEqual(shard.merge(shard2).compute(),
+                               streaming.compute())
+
+        # invalid labels and accumulators
+        labels = self.y.argmax(axis=1)
+        with self.assertRaises(ValueError):
+            stats.StreamingECE().update(self.probs, labels + 1)
+        with self.assertRaises(ValueError):
+            stats.StreamingECE().update(self.probs, labels.astype(float))
+        with self.assertRaises(ValueError):
+            streaming.update(self.probs[:, :3], labels % 3)
+        with self.assertRaises(ValueError):
+            streaming.merge(stats.StreamingECE())
+        with self.assertRaises(ValueError):
+            streaming.merge(stats.StreamingECE(binning=binning_scheme).update(
+                self.probs[:, :3], labels % 3))
+
+        # bins may not depend on the data
+        with self.assertRaises(ValueError):
+            stats.StreamingECE(binning=binning.DataDependentBinning())
+
+    def test_lensed_ece(self):
+        probs = np.random.dirichlet(np.ones(5), 500)
+        y = np.random.randint(0, 5, 500)
+        lens = lenses.MaximumLens()
+
+        # compare with applying the lens separately
+        for binning_scheme in [binning.UniformBinning(bins=5),
+                               binning.DataDependentBinning()]:
+            orig = stats.ece(*lens(probs, y), binning=binning_scheme)
+
+            lensed = stats.LensedECE(lens, binning=binning_scheme)
+            self.assertAlmostEqual(lensed(probs, y), orig)
+
+            lensed_chunks = stats.lensed_ece(probs, y, lens,
+                                             binning=binning_scheme,
+                                             chunksize=99)
+            self.assertAlmostEqual(lensed_chunks, orig)
+
+        # check that the lens is applied before resampling
+        np.random.seed(1234)
+        bootstrap = stats.bootstrap_ece(*lens(probs, y), n=10)
+        np.random.seed(1234)
+        self.assertEqual(stats.bootstrap_ece(probs, y, n=10, lens=lens),
+                         bootstrap)
+
+        np.random.seed(1234)
+        consistency = stats.consistency_ece(lens(probs, y)[0], n=10)
+        np.random.seed(1234)
+        self.assertEqual(stats.consistency_ece(probs, n=10, lens=lens),
+                         consistency)
+
+    def test_calibration_report(self):
+        probs = np.random.dirichlet(np.ones(5), 500)
+        y = np.random.randint(0, 5, 500)
+        lens_spec = {"identity": None, "max": lenses.MaximumLens(),
+                     "top2": lenses.Top2Lens()}
+        binning_spec = [binning.UniformBinning(bins=5),
+                        binning.DataDependentBinning()]
+        distance_spec = [distances.tvdistance, distances.l2distance]
+        score_spec = [scores.logarithmic_score, scores.QuadraticScore()]
+
+        report = stats.CalibrationReport(lens_spec, binning_spec,
+                                         distance_spec, score_spec)(probs, y)
+
+        # compare with separate evaluations
+        for lens_name, lens in lens_spec.items():
+            lensed = (probs, y) if lens is None else lens(probs, y)
+            for binning_scheme in binning_spec:
+                for distance in distance_spec:
+                    self.assertAlmostEqual(
+                        report["ece"][lens_name][repr(binning_scheme)][
+                            distance.__name__],
+                        stats.ece(*lensed, distance=distance,
+                                  binning=binning_scheme))
+
+        self.assertEqual(report["scores"]["logarithmic_score"],
+                         scores.logarithmic_score(probs, y))
+        self.assertEqual(report["scores"][repr(scores.QuadraticScore())],
+                         scores.quadratic_score(probs, y))
+
+        # check default specification
+        report = stats.calibration_report(probs, np.eye(5)[y])
+        self.assertAlmostEqual(
+            report["ece"]["None"]["UniformBinning(bins=10)"]["tvdistance"],
+            stats.ece(probs, np.eye(5)[y]))
+
+        # invalid labels
+        with self.assertRaises(ValueError):
+            stats.calibration_report(probs, y + 1)
+        with self.assertRaises(ValueError):
+            stats.calibration_report(probs, y.astype(float))
+
+    def test_rng(self):
+        # binning scheme that is treated as data dependent, which forces the
+        # generic resampling of the complete data set
+        class DependentUniformBinning(binning.UniformBinning):
+            data_dependent = True
+
+        binning_scheme = binning.UniformBinning(bins=5)
+        dependent_scheme = DependentUniformBinning(bins=5)
+
+        # consistent targets are sampled with the random number generator
+        self.assertEqual(stats.ece(self.probs, None, rng=1),
+                         stats.ece(self.probs, None, rng=1))
+        self.assertEqual(stats.ece(self.probs, None, rng=1),
+                         stats.ece(self.probs, None, rng=1, chunksize=30))
+
+        # resampling with data-independent bins yields the same results
+        bootstrap = stats.bootstrap_ece(self.probs, self.y, n=50,
+                                        binning=binning_scheme, rng=1)
+        bootstrap2 = stats.bootstrap_ece(self.probs, self.y, n=50,
+                                         binning=dependent_scheme, rng=1)
+        self.assertAlmostEqual(bootstrap[1], bootstrap2[1])
+
+        # objects convert their seed once: repeated calls continue the
+        # random stream, and objects with the same seed agree
+        for cls in [stats.BootstrapECE, stats.ConsistencyECE]:
+            estimator = cls(n=20, binning=binning_scheme, rng=1)
+            args = (self.probs, self.y) if cls is stats.BootstrapECE else \
+                (self.probs,)
+            first = estimator(*args)
+            self.assertNotEqual(estimator(*args), first)
+            self.assertEqual(cls(n=20, binning=binning_scheme, rng=1)(*args),
+                             first)
+
+        # consistent targets of binned data
+        binned_probs = [self.probs[:8], self.probs[8:]]
+        self.assertEqual(stats.ece_binned(binned_probs, None, rng=1),
+                         stats.ece_binned(binned_probs, None, rng=1))
+
+        consistency = stats.consistency_ece(self.probs, n=50,
+                                            binning=binning_scheme, rng=1)
+        consistency2 = stats.consistency_ece(self.probs, n=50,
+                                             binning=dependent_scheme, rng=1)
+        self.assertAlmostEqual(consistency[0], consistency2[0])
+        self.assertAlmostEqual(consistency[1], consistency2[1])
+
+    def test_cache(self):
+        cache = binning.BinningCache()
+        labels = np.argmax(self.y, axis=1)
+        for binning_scheme in [None, binning.DataDependentBinning(min_size=5)]:
+            ece = stats.ECE(binning=binning_scheme, cache=cache)
+            for y in [self.y, labels, self.y[::-1]]:
+                self.assertEqual(
+                    ece(self.probs, y),
+                    stats.ece(self.probs, y, binning=binning_scheme))
+        self.assertEqual((cache.hits, cache.misses), (4, 2))
+
+    def test_labels(self):
+        labels = np.argmax(self.y, axis=1)
+
+        # integer labels yield the same estimates as one-hot encoded targets
+        for binning_scheme in [binning.UniformBinning(bins=5),
+                               binning.DataDependentBinning(min_size=5)]:
+            self.assertEqual(
+                stats.ece(self.probs, labels, binning=binning_scheme),
+                stats.ece(self.probs, self.y, binning=binning_scheme))
+            self.assertEqual(
+                stats.bootstrap_ece(self.probs, labels, n=20,
+                                    binning=binning_scheme, rng=1),
+                stats.bootstrap_ece(self.probs, self.y, n=20,
+                                    binning=binning_scheme, rng=1))
+        self.assertAlmostEqual(
+            stats.ece(self.probs, labels, chunksize=7),
+            stats.ece(self.probs, self.y))
+
+        binned_probs = [self.probs[:8], self.probs[8:]]
+        self.assertAlmostEqual(
+            stats.ece_binned(binned_probs, [labels[:8], labels[8:]]),
+            stats.ece_binned(binned_probs, [self.y[:8], self.y[8:]]))
+
+        # invalid labels
+        with self.assertRaises(ValueError):
+            stats.ece(self.probs, labels + 1)
+        with self.assertRaises(ValueError):
+            stats.ece(self.probs, labels.astype(float))
+        with self.assertRaises(ValueError):
+            stats.ece(self.probs, labels[1:])
+
+    def test_float32(self):
+        probs = self.probs.astype(np.float32)
+        probs64 = probs.astype(np.float64)
+        y = np.argmax(self.y, axis=1)
+
+        for binning_scheme in [binning.UniformBinning(bins=5),
+                               binning.DataDependentBinning(min_size=5)]:
+            # probabilities are not converted
+            tree = binning.BinningTree(binning_scheme).fit(probs)
+            self.assertEqual(tree.probs.dtype, np.float32)
+
+            # sums in each bin are accumulated in double precision
+            self.assertAlmostEqual(
+                stats.ece(probs, self.y, binning=binning_scheme),
+                stats.ece(probs64, self.y, binning=binning_scheme),
+                places=12)
+
+        # lenses preserve the precision, and only their results are rounded
+        lensed_probs, _ = lenses.maximum_lens(probs, y)
+        self.assertEqual(lensed_probs.dtype, np.float32)
+        self.assertLess(
+            abs(stats.lensed_ece(probs, y, lens=lenses.MaximumLens()) -
+                stats.lensed_ece(probs64, y, lens=lenses.MaximumLens())),
+            2**-24)
+
+    def test_instrument(self):
+        with stats.instrument(memory=True) as record:
+            ece = stats.ece(self.probs, self.y)
+            stats.ece(self.probs, self.y, chunksize=5)
+        self.assertEqual(ece, stats.ece(self.probs, self.y))
+
+        result = record.to_dict()
+        self.assertEqual(result["stages"]["ece"]["calls"], 2)
+        for name in ["ece/binning.fit", "ece/binned_sums", "ece/ece_sums",
+                     "ece/region_sums"]:
+            self.assertIn(name, result["stages"])
+            self.assertGreaterEqual(result["stages"][name]["bytes"], 0)
+        self.assertEqual(len(result["metrics"]["ece/nbins"]), 2)
+        self.assertEqual(result["metrics"]["ece/nbins"][0],
+                         result["metrics"]["ece/nbins"][1])
+
     def test_bootstrap_ece(self):
         # for different numbers of bins
         for nbins in [1, 5]:
@@ -50,6 +370,18 @@ class TestStats(unittest.TestCase):
             self.assertEqual(bootstrap_orig, orig)
             self.assertLess(bootstrap_std, bootstrap_orig)
 
+            # compare with resampling the complete data set
+            np.random.seed(1234)
+            resample = sample.ResampleStats(
+                stats.ECE(binning=binning_scheme), n=100)
+            resample_std = np.std(resample(self.probs, self.y))
+
+            np.random.seed(1234)
+            _, bootstrap_std = stats.bootstrap_ece(
+                self.probs, self.y, n=100, binning=binning_scheme,
+                max_elements=600)
+            self.assertAlmostEqual(bootstrap_std, resample_std)
+
     def test_consistency_ece(self):
         # for different numbers of bins
         for nbins in [1, 5]:
@@ -66,6 +398,20 @@ class TestStats(unittest.TestCase):
             self.assertLess(consistency_mean, orig)
             self.assertLess(consistency_std, consistency_mean)
 
+            # compare with resampling the complete data set
+            np.random.seed(1234)
+            resample = sample.ResampleStats(
+                lambda x: stats.ece(x, None, binning=binning_scheme), n=100)
+            resample_samples = resample(self.probs)
+
+            np.random.seed(1234)
+            consistency_mean, consistency_std = stats.consistency_ece(
+                self.probs, n=100, binning=binning_scheme,
+                max_elements=600)
+            self.assertAlmostEqual(consistency_mean,
+                                   np.mean(resample_samples))
+            self.assertAlmostEqual(consistency_std, np.std(resample_samples))
+
 
 if __name__ == '__main__':
     unittest.main()